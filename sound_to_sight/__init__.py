@@ -1,3 +1,25 @@
 # __init__.py
-from .models import Note, Pattern, PlayerMeasure
-from .utils import export_timeline, export_pattern_definitions, calculate_fps
+# Exports are resolved on first access, so importing the package (e.g. for the CLI) does not load mmh3 or BPMtoFPS
+_LAZY_EXPORTS = {
+    'Note': 'models',
+    'Pattern': 'models',
+    'PlayerMeasure': 'models',
+    'export_timeline': 'utils',
+    'export_pattern_definitions': 'utils',
+    'calculate_fps': 'utils',
+}
+
+__all__ = list(_LAZY_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(f'.{_LAZY_EXPORTS[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
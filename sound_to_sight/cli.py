@@ -0,0 +1,190 @@
+import argparse
+import sys
+import time
+
+
+# Only the modules above are imported at start-up; everything else, including the parser, models and exporters (and
+# with them mmh3, BPMtoFPS and NumPy), is imported inside the subcommand that needs it.
+
+DEFAULT_RESOLUTION = (3840, 2160)
+DEFAULT_COLD_START_RUNS = 10
+DEFAULT_CLUSTER_THRESHOLD = 0.8
+COLD_START_COMMAND = [sys.executable, '-m', 'sound_to_sight', '--help']
+
+
+def _resolution(text: str) -> tuple[int, int]:
+    """Read a video resolution written as WIDTHxHEIGHT."""
+    try:
+        width, height = (int(x) for x in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Resolution must look like 3840x2160, not '{text}'")
+    return width, height
+
+
+def _sections(text: str) -> list[int]:
+    """Read section start bar numbers written as a comma-separated list, like the service's sections parameter."""
+    try:
+        return [int(x) for x in text.replace(',', ' ').split()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Sections must look like 329,676, not '{text}'")
+
+
+def _frame_rate(text: str) -> str:
+    """Check a frame rate such as 30, 29.97 or 30000/1001, keeping its spelling for the solver."""
+    from .frame_rate import to_frame_rate
+
+    try:
+        to_frame_rate(text)
+    except (ValueError, ZeroDivisionError):
+        raise argparse.ArgumentTypeError(f"Invalid frame rate: '{text}'")
+    return text
+
+
+def _frame_rates(text: str) -> list[str]:
+    """Read a comma-separated set of frame rates."""
+    return [_frame_rate(rate.strip()) for rate in text.split(',') if rate.strip()]
+
+
+def _parse(args: argparse.Namespace) -> int:
+    """Parse each file and print a summary of what was found."""
+    from contextlib import nullcontext
+    from .csv_reader import MidiCsvParser, Resources
+
+    resources = Resources()
+    for file in args.input_files:
+        store_context = nullcontext()
+        if args.out_of_core:
+            # Only loaded (with sqlite3) when spilling is asked for
+            from .spill_store import MeasureStore
+            store_context = MeasureStore()
+
+        with store_context as store:
+            start = time.perf_counter()
+            midi_parser = MidiCsvParser(file, args.fps, list(args.sections), resources)
+            if args.measures:
+                result = midi_parser.parse_range(*args.measures)
+            else:
+                result = midi_parser.parse(store)
+            elapsed = time.perf_counter() - start
+
+            player_measures, sections, bpm, notes_per_bar, division, total_length = result
+            measures = 0
+            patterns = set()
+            for player in player_measures.values():
+                for player_measure in player:
+                    measures += 1
+                    patterns.add(player_measure.pattern.hash)
+            print(f"{file}: {len(player_measures)} players, {measures} player measures, {len(patterns)} unique "
+                  f"patterns, {bpm:g} BPM, {notes_per_bar} beats per bar, division {division}, length {total_length} "
+                  f"ticks, sections {sections} ({elapsed * 1000:.1f} ms)")
+
+            if args.clusters is not None:
+                from .similarity import find_pattern_clusters
+
+                clusters = find_pattern_clusters(player_measures, args.clusters)
+                variants = sum(len(cluster['variants']) for cluster in clusters)
+                print(f"  {len(clusters)} near-duplicate clusters covering {variants} variant patterns "
+                      f"(similarity >= {args.clusters:g})")
+    return 0
+
+
+def _export(args: argparse.Namespace) -> int:
+    """Parse the files and write the JSON documents for the After Effects script."""
+    from .main import main as export
+
+    export(args.input_files, args.fps, args.resolution, list(args.sections), args.output_dir, args.clusters,
+           args.out_of_core, args.keyframes, args.frame_rates, args.target_fps)
+    return 0
+
+
+def _bench(args: argparse.Namespace) -> int:
+    """Measure CLI cold-start time, and optionally parse time, checking the cold start against a budget."""
+    import statistics
+    import subprocess
+
+    cold_starts = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        subprocess.run(COLD_START_COMMAND, stdout=subprocess.DEVNULL, check=True)
+        cold_starts.append((time.perf_counter() - start) * 1000)
+    median = statistics.median(cold_starts)
+    print(f"cold start: median {median:.1f} ms, min {min(cold_starts):.1f} ms, max {max(cold_starts):.1f} ms "
+          f"over {args.runs} runs")
+
+    if args.input_files:
+        from .csv_reader import MidiCsvParser, Resources
+
+        resources = Resources()
+        for file in args.input_files:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                MidiCsvParser(file, args.fps, [], resources).parse()
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"parse {file}: median {statistics.median(timings):.1f} ms over {args.repeat} runs")
+
+    if args.budget is not None and median > args.budget:
+        print(f"Cold start of {median:.1f} ms exceeds the budget of {args.budget:g} ms.", file=sys.stderr)
+        return 1
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='sound_to_sight',
+                                     description="Turn MIDI CSV files into data for music visualization videos.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parse_parser = subparsers.add_parser('parse', help="Parse files and print a summary.")
+    parse_parser.add_argument('input_files', nargs='+', help="MIDI CSV files to parse.")
+    parse_parser.add_argument('-f', '--fps', type=int, default=60, help="Frames per second of the video.")
+    parse_parser.add_argument('-s', '--sections', type=_sections, default=[],
+                              help="Comma-separated bar numbers at which sections start, e.g. 329,676.")
+    # A measure range is parsed from the index in memory, so it cannot be combined with spilling to disk
+    parse_mode = parse_parser.add_mutually_exclusive_group()
+    parse_mode.add_argument('-m', '--measures', type=int, nargs=2, metavar=('FIRST', 'LAST'), default=None,
+                            help="Only parse this range of measures.")
+    parse_mode.add_argument('--out_of_core', action='store_true',
+                            help="Spill parsed measures to a temporary on-disk store to bound memory use.")
+    parse_parser.add_argument('-c', '--clusters', type=float, default=None, metavar='THRESHOLD',
+                              help="Report near-duplicate patterns at this Jaccard similarity (e.g. "
+                                   f"{DEFAULT_CLUSTER_THRESHOLD}).")
+    parse_parser.set_defaults(func=_parse)
+
+    export_parser = subparsers.add_parser('export', help="Write the JSON documents for the After Effects script.")
+    export_parser.add_argument('input_files', nargs='+', help="MIDI CSV files to export.")
+    export_parser.add_argument('-f', '--fps', type=int, required=True, help="Frames per second of the video.")
+    export_parser.add_argument('-r', '--resolution', type=_resolution, default=DEFAULT_RESOLUTION,
+                               help="Video resolution as WIDTHxHEIGHT.")
+    export_parser.add_argument('-s', '--sections', type=_sections, default=[],
+                               help="Comma-separated bar numbers at which sections start, e.g. 329,676.")
+    export_parser.add_argument('-c', '--clusters', type=float, default=None, metavar='THRESHOLD',
+                               help="Also write pattern_clusters.json, grouping near-duplicate patterns at this "
+                                    f"Jaccard similarity (e.g. {DEFAULT_CLUSTER_THRESHOLD}).")
+    export_parser.add_argument('--frame_rates', type=_frame_rates, default=None, metavar='RATES',
+                               help="Comma-separated frame rates to choose the pattern frame rate from (e.g. "
+                                    "24,29.97,30), instead of every rate from 24 to 60 plus NTSC.")
+    export_parser.add_argument('--target_fps', type=_frame_rate, default=None, metavar='RATE',
+                               help="Preferred pattern frame rate; valid rates closest to it win (default: highest).")
+    export_parser.add_argument('-k', '--keyframes', action='store_true',
+                               help="Also write keyframes.json, the precomputed strike animation (requires NumPy).")
+    export_parser.add_argument('-o', '--output_dir', default='.', help="Directory to write the JSON documents to.")
+    export_parser.add_argument('--out_of_core', action='store_true',
+                               help="Spill parsed measures to a temporary on-disk store to bound memory use.")
+    export_parser.set_defaults(func=_export)
+
+    bench_parser = subparsers.add_parser('bench', help="Measure cold-start and parse times.")
+    bench_parser.add_argument('input_files', nargs='*', help="MIDI CSV files to time parsing for.")
+    bench_parser.add_argument('-n', '--runs', type=int, default=DEFAULT_COLD_START_RUNS,
+                              help="Number of cold starts to time.")
+    bench_parser.add_argument('--repeat', type=int, default=3, help="Number of timed parses per file.")
+    bench_parser.add_argument('-f', '--fps', type=int, default=60, help="Frames per second used when parsing.")
+    bench_parser.add_argument('-b', '--budget', type=float, default=None,
+                              help="Fail if the median cold start exceeds this many milliseconds.")
+    bench_parser.set_defaults(func=_bench)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -1,7 +1,22 @@
 import json
 import csv
+import os
 import re
+from bisect import bisect_right
+from typing import Iterable, TYPE_CHECKING
 from sound_to_sight import Note, Pattern
+from .measure_index import MeasureIndex
+from .tokenizer import (HEADER, TEMPO, TIME_SIGNATURE, TITLE, INSTRUMENT_NAME, NOTE_ON, NOTE_OFF, END_TRACK,
+                        FileEvents, tokenize, scan, event_at, open_buffer, close_buffer)
+
+if TYPE_CHECKING:
+    # Only used in annotations; importing it at run time would load sqlite3 with every parser
+    from .spill_store import MeasureStore
+
+
+# Location of the bundled instrument and note data, independent of the working directory
+MIDI_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'midi_data')
+MIDI_NOTE_COUNT = 128
 
 
 def _load_file(file: str, filetype: str = "json") -> list[list[str]] | dict[str, dict[str, str]]:
@@ -24,19 +39,66 @@ def _load_file(file: str, filetype: str = "json") -> list[list[str]] | dict[str,
             raise ValueError("Unsupported filetype: must be 'json' or 'csv'")
 
 
+def find_section(section_start_times: list[int], measure: int) -> int:
+    """
+    Return the 1-based section number containing a measure.
+    The section start times must be sorted and unique, as produced by `MidiCsvParser.establish_sections`. The lookup
+    is a binary search, so it does not depend on the order in which measures are visited.
+
+    Parameters:
+        section_start_times (list): Sorted bar numbers at which each section starts.
+        measure (int): The 1-based measure number.
+
+    Returns:
+        int: The section number, or 0 for a measure before the first section.
+    """
+    return bisect_right(section_start_times, measure)
+
+
+class LayoutTable:
+    """
+    LayoutTable Class
+
+    A layout file compiled into a dense lookup table, so that placing a note is a single list index.
+
+    Attributes:
+        name (str): The layout name used on notes, e.g. "marimba" for marimba_layout.json.
+        coords (list): 128 entries, one per MIDI note, holding an (x, y) tuple or None when the layout has no complete
+            coordinates for that note.
+        valid (bytes): 128 flags, 1 where `coords` holds coordinates.
+    """
+    __slots__ = ('name', 'coords', 'valid')
+
+    def __init__(self, layout_file: str, layout_coord: dict[int, list[dict[str, float]]]):
+        self.name = layout_file.replace('_layout.json', '')
+        self.coords: list[tuple[float, float] | None] = [None] * MIDI_NOTE_COUNT
+
+        # Each note lists its coordinates; only the first set is used
+        for note_value, values in layout_coord.items():
+            if 0 <= note_value < MIDI_NOTE_COUNT and values:
+                x, y = values[0].get('x'), values[0].get('y')
+                if x is not None and y is not None:
+                    self.coords[note_value] = (x, y)
+
+        self.valid = bytes(coordinates is not None for coordinates in self.coords)
+
+    def invalid_notes(self, note_values) -> list[int]:
+        """Return, in ascending order, the note values this layout has no coordinates for."""
+        return sorted(note for note in note_values if not (0 <= note < MIDI_NOTE_COUNT and self.valid[note]))
+
+
 # Initialize current placement in row examination
 class Status:
     """
     Status Class
 
     This class is used to keep track of the current state of the MIDI parsing process.
-    It includes information about the current player, measure, section, and coordinates.
+    It includes information about the current player, measure, and section.
 
     Attributes:
         current_player (int): The current player number being processed.
         current_measure (int): The current measure number being processed.
         current_section (int): The current section number being processed.
-        current_coords (tuple): The current coordinates of the note being processed.
 
     Methods:
         __init__: Initializes the Status object with default values.
@@ -48,7 +110,6 @@ class Status:
         self.current_player = 1 # Start with player 1
         self.current_measure = 1 # Start with measure 1
         self.current_section = 0
-        self.current_coords: dict[int, list[dict[str, int]]] | None = None
 
 class Resources:
     """
@@ -60,12 +121,13 @@ class Resources:
     Attributes:
         supported_instruments (dict): A dictionary containing information about supported instruments.
         instrument_layout (dict): A dictionary mapping instruments to their layout files.
-        layout_coordinates (dict): A dictionary mapping instruments to their layout coordinates.
+        layout_tables (dict): A dictionary mapping instruments to their compiled LayoutTable.
         note_symbols (dict): A dictionary mapping MIDI note numbers to note symbols.
 
     Methods:
         __init__: Initializes the Resources object and loads the necessary data.
         _load_midi_info: Loads MIDI note information from a JSON file and converts it into a usable format.
+        _initialize_instrument_layouts: Compiles the layout of every supported instrument.
     
     Returns:
         None
@@ -74,18 +136,20 @@ class Resources:
     def __init__(self):
         """
         Initialize the Resources object and load necessary data.
-        This method loads the supported instruments from a JSON file, initializes the instrument layout and layout coordinates,
-        and loads MIDI note symbols from a JSON file.
+        This method loads the supported instruments from a JSON file, initializes the instrument layouts and their
+        compiled tables, and loads MIDI note symbols from a JSON file.
         It also initializes the note_symbols dictionary to map MIDI note numbers to their corresponding symbols.
 
         Returns:
             None
         """
 
-        self.supported_instruments = _load_file('midi_data/supported_instruments.json', filetype='json')
+        self.supported_instruments = _load_file(os.path.join(MIDI_DATA_DIR, 'supported_instruments.json'),
+                                                filetype='json')
         self.instrument_layout = {}
-        self.layout_coordinates = {}
+        self.layout_tables: dict[str, LayoutTable] = {}
         self.note_symbols = self._load_midi_info()
+        self._initialize_instrument_layouts()
 
     def _load_midi_info(self) -> dict[int, str]:
         """
@@ -97,7 +161,7 @@ class Resources:
             dict[int, str]: A dictionary mapping MIDI note numbers to note symbols.
         """
         # Load MIDI info from the JSON file
-        midi_info_file = 'midi_data/midi_info.json'  # Path to the MIDI info JSON file
+        midi_info_file = os.path.join(MIDI_DATA_DIR, 'midi_info.json')  # Path to the MIDI info JSON file
         midi_info = _load_file(midi_info_file)
 
         # Convert the MIDI info into a more usable format, if necessary
@@ -105,6 +169,33 @@ class Resources:
         note_symbols = {int(note["MIDI Note Number"]): note["Note Symbol"] for note in midi_info}
         return note_symbols
 
+    def _initialize_instrument_layouts(self):
+        """
+        Initialize instrument layouts and coordinates from JSON files.
+        This method loads the supported instruments and their corresponding layouts from JSON files.
+        It also creates a dictionary to store already loaded layouts to prevent duplicate loading, and compiles each
+        layout once into a LayoutTable.
+        
+        Returns:
+            None
+        """
+        # Create a dictionary to store already compiled layouts to prevent duplicate loading
+        compiled_layouts = {}
+
+        # Populate the instrument_layout and layout_tables dictionaries
+        for instrument, data in self.supported_instruments.items():
+            layout_file = data['layout']
+
+            # Check if layout is already loaded
+            if layout_file not in compiled_layouts:
+                layout = _load_file(os.path.join(MIDI_DATA_DIR, 'visual_layouts', layout_file))
+                layout_coord = {int(key): values for key, values in layout.items()}
+                compiled_layouts[layout_file] = LayoutTable(layout_file, layout_coord)
+
+            # Assign loaded layout to the instrument
+            self.instrument_layout[instrument] = layout_file
+            self.layout_tables[instrument] = compiled_layouts[layout_file]
+
 class MidiCsvParser:
     """
     MidiCsvParser Class
@@ -117,12 +208,21 @@ class MidiCsvParser:
     # Constants for time calculations
     MICROSECONDS_PER_MINUTE = 60000000
 
-    def __init__(self, filename: str, fps: int, section_start_times: list[int]):
+    def __init__(self, filename: str, fps: int, section_start_times: list[int], resources: Resources | None = None,
+                 interactive: bool = True):
     
         self.status = Status() # Initialize the status object to track current parsing state
 
+        # Shared, read-only instrument and note data; pass a preloaded instance to avoid reloading it per parse
+        self.resources = resources if resources is not None else Resources()
+        self.supported_instruments = self.resources.supported_instruments
+        self.instrument_layout = self.resources.instrument_layout
+        self.layout_tables = self.resources.layout_tables
+        self.note_symbols = self.resources.note_symbols
+
         self.filename = filename
         self.fps = fps
+        self.interactive = interactive  # Whether an instrument without a layout may be resolved by prompting the user
         self.section_start_times = section_start_times  # To manage different sections in the music
 
         # Initialize attributes to store MIDI file metadata
@@ -139,96 +239,181 @@ class MidiCsvParser:
         self.default_instrument = "keyboard"  # Default instrument in case of missing data
         self.pattern_length = None  # Initialize pattern_length
         self.total_length = 0
+        self.measure_range: tuple[int, int] | None = None  # First and last measure kept by a partial parse
+        self.tempo_map: list[int] = []  # Every tempo (microseconds per quarter note) found in the file
+        self.player_layouts: dict[int, LayoutTable] = {}  # Compiled layout of each player, once resolved
+        self.track_notes: dict[int, set[int]] = {}  # Note values played on each track, for up-front validation
 
-    from typing import Callable, Any
-
-    def _row_data(self, row: list[str], fields: list[int], cast_func: Callable[[str], Any]) -> list[Any]:
+    def parse(self, store: 'MeasureStore | None' = None
+              ) -> tuple[dict[int, dict[int, dict[int, Pattern]]], list[int], float, int, int, int]:
         """
-        Extracts data from a row based on specified fields and applies a casting function to each field.
-        This method is used to convert the data in the specified fields to the desired type.
-        
+        Open and read the CSV file specified by `filename`. Then, perform further parsing operations on the contents
+        of the file.
+
+        With a `store`, the parse runs in bounded memory: the file is re-read for each pass instead of holding all of
+        its events, and each player measure is written to the store as soon as it can no longer change. The player
+        measures returned are then read back from the store.
+
         Parameters:
-            row (list): The row from which to extract data.
-            fields (list): A list of field indices to extract from the row.
-            cast_func (Callable[[str], Any]): A function to cast the extracted data to the desired type.
+        - self: The instance of the class calling the method.
+        - store: An optional MeasureStore to spill finalized player measures to.
 
         Returns:
-            list: A list of extracted and casted data.
+        - `player_measures`: The final result after parsing.
         """
-        # Extract data from the row based on specified fields and apply casting function
-        return [cast_func(row[field]) for field in fields]
+        if store is None:
+            # Read the events of interest from the CSV file once, and reuse them for every pass
+            events = list(tokenize(self.filename))
+        else:
+            events = FileEvents(self.filename)
 
-    def parse(self) -> tuple[dict[int, dict[int, dict[int, Pattern]]], list[int], float, int, int, int]:
+        return self.parse_events(events, store)
+
+    def parse_events(self, events: Iterable[tuple], store: 'MeasureStore | None' = None
+                     ) -> tuple[dict[int, dict[int, dict[int, Pattern]]], list[int], float, int, int, int]:
         """
-        Open and read the CSV file specified by `filename`. Then, perform further parsing operations on the contents
-        of the file.
+        Parse typed events, as yielded by the tokenizer, from any source (e.g. events received from another process).
+        The events are read in several passes, so a one-shot iterator is first collected into a list.
 
         Parameters:
-        - self: The instance of the class calling the method.
+            events (Iterable): The typed events of a MIDI CSV file, in file order.
+            store (MeasureStore): An optional MeasureStore to spill finalized player measures to.
 
         Returns:
-        - `player_measures`: The final result after parsing.
+            The same tuple as `parse`.
         """
-        # Open and read the CSV file
-        rows = _load_file(self.filename)
-        if not isinstance(rows, list):
-            raise ValueError("Expected CSV file to be loaded as a list of rows, but got a different type.")
+        if iter(events) is events:
+            events = list(events)
+        if store is not None:
+            self.player_measures = store.spill()
 
         # Parse the header to extract MIDI file metadata
-        self._parse_header(rows)
+        self._parse_header(events)
+
+        # Collect the notes of each track, so they can be checked against its layout in one pass
+        for event in events:
+            if event[0] == NOTE_ON:
+                self.track_notes.setdefault(event[1], set()).add(event[3])
 
         # Validate section start time input
         self.establish_sections()
 
-        # Load additional resources necessary for parsing
-        self.supported_instruments = {}
-        self._initialize_instrument_layouts()
+        # Main loop to process each event in the CSV file
+        for event in events:
+            self._process_event(event)
 
-        # Main loop to process each row in the CSV file
-        for row in rows:
-            self._process_row(row)
+        if store is not None:
+            self.player_measures = self.player_measures.close()
 
         # Return the final result after parsing
         return (self.player_measures, self.section_start_times, self.bpm, self.notes_per_bar,
                 self.division, self.total_length)
 
-    def _initialize_instrument_layouts(self):
+    def parse_range(self, first_measure: int, last_measure: int, index: MeasureIndex | None = None
+                    ) -> tuple[dict[int, dict[int, dict[int, Pattern]]], list[int], float, int, int, int]:
         """
-        Initialize instrument layouts and coordinates from JSON files.
-        This method loads the supported instruments and their corresponding layouts from JSON files.
-        It also creates a dictionary to store already loaded layouts to prevent duplicate loading.
-        
+        Parse only the measures from `first_measure` to `last_measure`, inclusive.
+        This method uses a sparse measure index (built on first use and saved beside the file) to seek each track
+        directly to the range, replaying only its instrument declarations and the notes still sounding at the start
+        of the range. Patterns outside the range are discarded, so the result covers the requested measures only.
+
+        Parameters:
+            first_measure (int): The first measure to parse (1-based).
+            last_measure (int): The last measure to parse.
+            index (MeasureIndex): A preloaded index for the file, if available.
+
+        Raises:
+            ValueError: If the measure range is empty or invalid.
+
         Returns:
-            None
+            The same tuple as `parse`, restricted to the requested measures.
         """
-        # Create a dictionary to store already loaded layouts to prevent duplicate loading
-        loaded_layouts = {}
+        if first_measure < 1 or last_measure < first_measure:
+            raise ValueError(f"Invalid measure range: {first_measure}-{last_measure}")
 
-        # Populate the instrument_layout and layout_coordinates dictionaries
-        for instrument, data in self.supported_instruments.items():
-            layout_file = data['layout']
+        index = index if index is not None else MeasureIndex.load_or_build(self.filename)
+        self.division, self.tempo, self.notes_per_bar = index.division, index.tempo, index.notes_per_bar
+        self._set_pattern_timing()
+        self.establish_sections()
+        self.total_length = index.total_length
+        self.measure_range = (first_measure, last_measure)
+
+        buffer = open_buffer(self.filename)
+        try:
+            for track in index.tracks:
+                # Instrument declarations assign the player numbers and instruments, so always replay them
+                for offset in index.declarations[track]:
+                    self._process_event(event_at(buffer, offset))
+
+                offset, carried = index.locate(buffer, track, first_measure)
+                if offset is None:
+                    continue
+
+                # Notes that started before the range but are still sounding at its start
+                for carried_offset in carried:
+                    self._process_event(event_at(buffer, carried_offset))
+
+                for _, event in scan(buffer, offset):
+                    if event[1] != track or self._process_range_event(event):
+                        break
+        finally:
+            close_buffer(buffer)
+
+        self.measure_range = None
+        return (self.player_measures, self.section_start_times, self.bpm, self.notes_per_bar,
+                self.division, self.total_length)
 
-            # Check if layout is already loaded
-            if layout_file not in loaded_layouts:
-                layout_dir = 'midi_data/visual_layouts/'
-                layout = _load_file(layout_dir + layout_file)
-                layout_coord = {int(key): values for key, values in layout.items()}
-                loaded_layouts[layout_file] = layout_coord
+    def _process_range_event(self, event: tuple) -> bool:
+        """
+        Process an event during a partial parse.
+        Note-ons after the last measure of the range are skipped, while note-offs are still processed so that the
+        notes of the last measures receive their lengths.
 
-            # Assign loaded layout to the instrument
-            self.instrument_layout[instrument] = layout_file
-            self.layout_coordinates[instrument] = loaded_layouts[layout_file]
+        Parameters:
+            event (tuple): A typed event from the tokenizer.
+
+        Returns:
+            bool: True once the rest of the track can be skipped.
+        """
+        event_type = event[0]
+        if event_type == TITLE or event_type == INSTRUMENT_NAME:
+            return False  # Already replayed from the index
+        if event_type == END_TRACK:
+            self._flush_range_patterns()
+            return True
+
+        last_measure = self.measure_range[1]
+        measure = (event[2] // self.pattern_length) + 1
+        if measure <= last_measure:
+            self._process_event(event)
+            return False
+
+        self.status.current_measure = measure
+        if event_type == NOTE_OFF:
+            self._handle_note_off(event)
+
+        # Stop reading this track once every pattern within the range has all of its note lengths
+        if all(pattern.is_complete() for key, pattern in self.unfinished_patterns.items()
+               if key[0] == self.status.current_player and key[1] <= last_measure):
+            self._flush_range_patterns()
+            return True
+        return False
+
+    def _flush_range_patterns(self):
+        """Finalize every complete pattern of a partial parse, as if the track had continued past the range."""
+        self.status.current_measure = self.measure_range[1] + 1
+        self._finalize_patterns()
 
-    def _parse_header(self, rows: list[list[str]]):
+    def _parse_header(self, events: Iterable[tuple]):
         """
         Parse the header of the MIDI CSV file to extract metadata such as division, tempo, and notes per bar.
-        This method iterates through the rows of the CSV file and identifies the relevant metadata based on the event type.
-        It stops parsing when it encounters a 'note_on_c' event, as this indicates the start of the actual note events.
+        This method iterates through the events of the CSV file and identifies the relevant metadata based on the event type.
+        It stops parsing when it encounters a 'Note_on_c' event, as this indicates the start of the actual note events.
         It also validates the extracted metadata to ensure that all required fields are present.
         If any required metadata is missing, it raises a ValueError to indicate the issue.
 
         Parameters:
-            rows (list): A list of rows from the MIDI CSV file.
+            events (Iterable): The typed events of the MIDI CSV file.
         
         Raises:
             ValueError: If any required metadata is missing or incomplete.
@@ -237,24 +422,33 @@ class MidiCsvParser:
             None
         """
         # Initialize metadata attributes
-        for row in rows:
-            event_type = self._row_data(row, [2], lambda x: x.strip())[0]
+        for event in events:
+            event_type = event[0]
 
-            # Identify the row type and extract relevant information
-            if event_type == 'note_on_c':
-                # Stop metadata extraction when note rows are reached
+            # Identify the event type and extract relevant information
+            if event_type == NOTE_ON:
+                # Stop metadata extraction when note events are reached
                 break
-            if event_type == 'Header':
-                self.division = self._row_data(row, [5], int)[0]
-            if event_type == 'Tempo':
-                self.tempo = self._row_data(row, [3], int)[0]
-            if event_type == 'Time_signature':
-                self.notes_per_bar = self._row_data(row, [3], int)[0]
+            if event_type == HEADER:
+                self.division = event[3]
+            if event_type == TEMPO:
+                self.tempo = event[3]
+            if event_type == TIME_SIGNATURE:
+                self.notes_per_bar = event[3]
 
         # Validate extracted metadata
         if not all([self.division, self.tempo, self.notes_per_bar]):
             raise ValueError('Incomplete metadata, please check the MIDI CSV file')
 
+        self._set_pattern_timing()
+
+    def _set_pattern_timing(self):
+        """
+        Derive the pattern length and BPM from the division, tempo and notes per bar.
+
+        Returns:
+            None
+        """
         # Calculate pattern_length based on division and notes_per_bar
         self.pattern_length = self.division * self.notes_per_bar
 
@@ -292,124 +486,143 @@ class MidiCsvParser:
         Establish sections based on the provided section start times.
         This method checks if the section start times are provided and ensures that the first section starts at time 1.
         If the first section start time is not 1, it prepends 1 to the list of section start times.
-        It also ensures that the section start times are in ascending order.
+        It also ensures that the section start times are unique and in ascending order.
         
         Returns:
             None
         """
-        # Ensure section start times are in ascending order
-        self.section_start_times.sort()
-        if not self.section_start_times:
-            self.section_start_times = [1]
-        elif len(self.section_start_times) == 1:
-            self.section_start_times = [1, self.section_start_times[0]]
-        elif len(self.section_start_times) > 1 and self.section_start_times[0] != 1:
-            self.section_start_times = [1] + self.section_start_times
+        # Ensure section start times are unique, in ascending order and that the first section starts at measure 1,
+        # so that sections can be looked up with a binary search
+        self.section_start_times = sorted({int(start) for start in self.section_start_times if int(start) > 1} | {1})
 
-    def _process_row(self, row: list[str]) -> None:
+    def _process_event(self, event: tuple) -> None:
         """
-        Process a single row of the MIDI CSV file.
-        This method extracts relevant information from the row, such as time, event type, and instrument declarations.
+        Process a single event of the MIDI CSV file.
+        This method reads the time and event type of the event and dispatches it to the matching handler.
         It updates the current measure and section based on the time information and handles different MIDI event types
         accordingly. It also manages the unfinished patterns and finalizes them when necessary.
         
         Parameters:
-            row (list): A single row from the MIDI CSV file.
+            event (tuple): A typed event from the tokenizer.
             
         Returns:
             None
         """
-        # Extract relevant information from the row
-        time = self._row_data(row, [1], int)[0]
-        event_type = self._row_data(row, [2], lambda x: x.strip())[0]
+        # Extract relevant information from the event
+        event_type, time = event[0], event[2]
 
         # Update the current measure based on the time and pattern length
-        Status.current_measure = (time // self.pattern_length) + 1
+        self.status.current_measure = (time // self.pattern_length) + 1
 
         # Handle different MIDI event types by delegating to specific methods
-        if event_type == 'Note_on_c':
-            self._handle_note_on(row)
-        elif event_type == 'Note_off_c':
-            self._handle_note_off(row)
-        elif event_type in ['Title_t', 'Instrument_name_t']:
-            self._handle_instrument_declaration(row)
-        elif event_type == 'End_track':
-            self._find_total_length(row)
-
-    def _find_total_length(self, row):
+        if event_type == NOTE_ON:
+            self._handle_note_on(event)
+        elif event_type == NOTE_OFF:
+            self._handle_note_off(event)
+        elif event_type == TITLE or event_type == INSTRUMENT_NAME:
+            self._handle_instrument_declaration(event)
+        elif event_type == END_TRACK:
+            self._find_total_length(event)
+        elif event_type == TEMPO:
+            self.tempo_map.append(event[3])
+
+    def _find_total_length(self, event):
         """
         Finds the total length of the MIDI file based on the 'End_track' event.
-        This method extracts the length from the row and updates the total length if it is greater than the current total length.
+        This method takes the length from the event time and updates the total length if it is greater than the current total length.
         
         Parameters:
-            row (list): A single row from the MIDI CSV file.
+            event (tuple): A typed event from the tokenizer.
             
         Returns:
             None
         """
-        # Extract the length from the row and update the total length
-        length = int(row[1])
+        # Take the length from the event and update the total length
+        length = event[2]
         if length > self.total_length:
             self.total_length = length
 
-    def _handle_note_on(self, row):
+    def _handle_note_on(self, event):
         """
         Handles a 'Note_on_c' event.
-        This method extracts relevant information from the row, such as time, track, note value, and velocity.
+        This method extracts relevant information from the event, such as time, track, note value, and velocity.
         It calculates the measure time and current measure, updates the current section count if applicable,
         and retrieves instrument and layout information. It then creates a Note object and adds it to the unfinished patterns.
         
         Parameters:
-            row (list): A single row from the MIDI CSV file.
+            event (tuple): A typed event from the tokenizer.
 
         Returns:
             None
         """
-        # Extract relevant information from the row
-        time, track, note_value, velocity = self._row_data(row, [1, 0, 4, 5], int)
+        # Extract relevant information from the event
+        _, track, time, note_value, velocity = event
 
         # Calculate measure time and current measure
         measure_time = time % self.pattern_length
 
-        # Update the current section count, if applicable
-        self._get_section()
+        # Look up the section containing the current measure
+        self.status.current_section = self._get_section(self.status.current_measure)
 
         # Retrieve instrument and layout information
-        if not self.player_instruments[Status.current_player]['layout']:
-            self._get_instrument_and_layout()
+        layout = self.player_layouts.get(self.status.current_player)
+        if layout is None:
+            layout = self._get_instrument_and_layout(track)
 
-        x, y = self._get_note_coordinates(note_value)
-        layout_name = self.player_instruments[Status.current_player]['layout'].replace('_layout.json', '')
-        note = self._create_note(time, measure_time, note_value, velocity, layout_name, x, y)
-        instrument = self.player_instruments[Status.current_player]['instrument']
-        footage = self.player_instruments[Status.current_player]['footage']
+        x, y = self._get_note_coordinates(layout, note_value)
+        note = self._create_note(time, measure_time, note_value, velocity, layout.name, x, y)
+        instrument = self.player_instruments[self.status.current_player]['instrument']
+        footage = self.player_instruments[self.status.current_player]['footage']
 
         # Directly add note to pattern, avoiding multiple dictionary lookups
-        dict_key = (Status.current_player, Status.current_measure, Status.current_section)
+        dict_key = (self.status.current_player, self.status.current_measure, self.status.current_section)
         self.unfinished_patterns.setdefault(dict_key, Pattern(instrument, footage)).add_note(note)
 
-    def _get_section(self):
+    def _get_section(self, measure: int) -> int:
         """
-        Update the current section based on the time and section start times.
-        This method checks if the current measure is greater than or equal to the start time of the current section.
-        If so, it increments the current section count. This is used to manage different sections in the music.
-        
+        Return the section number for a measure.
+        This method searches the sorted section start times, so it is correct for any measure regardless of the order
+        in which events are processed, and for sections that contain no notes.
+
+        Parameters:
+            measure (int): The 1-based measure number.
+
         Returns:
-            None
+            int: The section number the measure belongs to.
+        """
+        return find_section(self.section_start_times, measure)
+
+    def get_sections(self, measures: Iterable[int]) -> list[int]:
+        """
+        Return the section number for each of the given measures.
+        This is the bulk form of `_get_section`, for assigning sections to measures outside of the streaming parse.
+
+        Parameters:
+            measures (Iterable[int]): The 1-based measure numbers.
+
+        Returns:
+            list[int]: The section number for each measure, in the same order.
         """
-        # Determine the current section based on time and section_start_times
-        if Status.current_section < len(self.section_start_times) and (
-                Status.current_measure >= self.section_start_times[Status.current_section]):
-            Status.current_section += 1
+        section_start_times = self.section_start_times
+        return [bisect_right(section_start_times, measure) for measure in measures]
 
-    def _get_instrument_and_layout(self):
+    def _get_instrument_and_layout(self, track: int) -> LayoutTable:
         """Retrieve instrument and layout for the current player.
         This method checks if the current player has a layout defined. If not, it prompts the user to input an instrument name.
         It also retrieves the layout file and footage information for the instrument.
-        If the layout file is not found, it prompts the user to input a physical instrument name or use a default keyboard-based layout.
+        If the layout file is not found, it prompts the user to input a physical instrument name or use a default keyboard-based layout;
+        a non-interactive parser (such as one running in a service worker) raises instead.
+        Every note the track plays is then checked against the layout at once, so all missing notes are reported together.
         
+        Parameters:
+            track (int): The track the current player was assigned from.
+
+        Raises:
+            ValueError: If the instrument has no layout and the parser is not interactive, or if the layout has no
+                coordinates, or lacks coordinates for any note played on the track.
+
         Returns:
-            None
+            LayoutTable: The compiled layout of the current player.
         """
         # Retrieve the instrument for the current player
         instrument = self.player_instruments[self.status.current_player]['instrument']
@@ -420,6 +633,10 @@ class MidiCsvParser:
             layout_file = self.instrument_layout.get(instrument)
 
             if not layout_file:
+                if not self.interactive:
+                    raise ValueError(f"The instrument '{instrument}' of player {self.status.current_player} does not "
+                                     "have a corresponding layout.")
+
                 user_instrument = input(f"The instrument '{instrument}' does not have a corresponding layout. "
                                         "Please input the name of a physical instrument, or press Enter to "
                                         "use a default keyboard-based layout: ").lower().strip()
@@ -433,16 +650,26 @@ class MidiCsvParser:
         self.player_instruments[self.status.current_player]['footage'] = self.supported_instruments[instrument]['footage']
 
         # Extract layout coordinates
-        self.status.current_coords = self.layout_coordinates.get(instrument)
-        if not self.status.current_coords:
+        layout = self.layout_tables.get(instrument)
+        if layout is None or not any(layout.valid):
             raise ValueError(f"No layout coordinates found for layout file: {layout_file}")
 
-    def _get_note_coordinates(self, note_value: int) -> tuple[int, int]:
+        # Validate every note of the track against the layout up front
+        invalid_notes = layout.invalid_notes(self.track_notes.get(track, ()))
+        if invalid_notes:
+            raise ValueError(f"No coordinates found for note values {invalid_notes} of player "
+                             f"{self.status.current_player} in the layout file: {layout_file}")
+
+        self.player_layouts[self.status.current_player] = layout
+        return layout
+
+    def _get_note_coordinates(self, layout: LayoutTable, note_value: int) -> tuple[int, int]:
         """Retrieve x, y coordinates for the note based on its value and layout.
-        This method checks if the note value exists in the current layout coordinates.
-        If it does, it retrieves the x and y coordinates. If not, it raises a ValueError.
+        This method reads the note's entry in the current player's compiled layout table.
+        If the layout has no complete coordinates for the note, it raises a ValueError.
         
         Parameters:
+            layout (LayoutTable): The compiled layout of the current player.
             note_value (int): The MIDI note value for which to retrieve coordinates.
         
         Raises:
@@ -451,23 +678,12 @@ class MidiCsvParser:
         Returns:
             tuple[int, int]: A tuple containing the x and y coordinates for the note.
         """
-        # Check if the note value exists in the current layout coordinates
-        if note_value not in self.status.current_coords:
+        # Single lookup in the compiled layout table
+        coordinates = layout.coords[note_value] if 0 <= note_value < MIDI_NOTE_COUNT else None
+        if coordinates is None:
             raise ValueError(f"No coordinates found for note value: {note_value} in the given layout.")
 
-        # Assuming the layout_coordinates are stored as a list of coordinates for each note value,
-        # and we're taking the first set of coordinates for simplicity.
-        # You might need to adjust this if your data structure is different.
-        coordinates = self.status.current_coords[note_value][0]
-
-        # Extract x and y values
-        x = coordinates.get('x')
-        y = coordinates.get('y')
-
-        if x is None or y is None:
-            raise ValueError(f"Incomplete coordinates for note value: {note_value} in the given layout.")
-
-        return x, y
+        return coordinates
 
     def _create_note(self, time, measure_time, note_value, velocity, layout, x, y) -> Note:
         """Creates and returns a new Note object.
@@ -492,20 +708,20 @@ class MidiCsvParser:
         note.set_timing_info(self.bpm, self.division, self.fps)
         return note
 
-    def _handle_note_off(self, row):
+    def _handle_note_off(self, event):
         """Handles a 'Note_off_c' event.
-        This method extracts relevant information from the row, such as time, track, and note value.
+        This method extracts relevant information from the event, such as time, track, and note value.
         It updates the unfinished patterns by setting the length of the note to the difference between the current time
         and the start time of the note. It also finalizes patterns if necessary.
         
         Parameters:
-            row (list): A single row from the MIDI CSV file.
+            event (tuple): A typed event from the tokenizer.
         
         Returns:
             None
         """
-        # Extract relevant information from the row
-        time, track, note_value = self._row_data(row, [1, 0, 4], int)
+        # Extract relevant information from the event
+        _, track, time, note_value = event
 
         # Process incomplete patterns more efficiently
         for pattern in self.unfinished_patterns.values():
@@ -534,22 +750,22 @@ class MidiCsvParser:
         patterns_to_finalize = []
         for key, pattern in self.unfinished_patterns.items():
             _, measure_number, _ = key
-            if measure_number < Status.current_measure and pattern.is_complete():
+            if measure_number < self.status.current_measure and pattern.is_complete():
                 patterns_to_finalize.append((key, pattern))
 
         # Finalize the patterns outside the loop
         for key, pattern in patterns_to_finalize:
             player, measure, section = key
+            if self.measure_range and measure < self.measure_range[0]:
+                # Carried-over notes from before a partial parse's range only pair up note-offs; drop them
+                del self.unfinished_patterns[key]
+                continue
             pattern.finalize(self.player_measures, player, measure, section, pattern.instrument, pattern.footage,
                              self.unfinished_patterns, key, timing_info)
 
-    def _handle_instrument_declaration(self, row):
+    def _handle_instrument_declaration(self, event):
         """Handles instrument declarations in the MIDI file."""
-        _, track = self._row_data(row, [1, 0], int)
-        event_type, instrument_name = self._row_data(row, [2, 3], lambda x: x.strip())
-
-        # A new player means sections reset to 1
-        Status.current_section = 1
+        event_type, track, _, instrument_name = event
 
         # Assign a new player number to a new track if not already assigned
         if track not in self.track_to_player:
@@ -557,18 +773,19 @@ class MidiCsvParser:
             self.player_number += 1
 
         # Get the current player number for this track
-        Status.current_player = self.track_to_player[track]
+        self.status.current_player = self.track_to_player[track]
 
         # Process the instrument name and update the player's instrument
-        instrument = self._process_instrument_name(instrument_name, event_type, Status.current_player)
-        self.player_instruments[Status.current_player] = {"instrument": instrument, "layout": "", "footage": ""}
+        instrument = self._process_instrument_name(instrument_name, event_type, self.status.current_player)
+        self.player_instruments[self.status.current_player] = {"instrument": instrument, "layout": "", "footage": ""}
+        self.player_layouts.pop(self.status.current_player, None)
 
     def _process_instrument_name(self, instrument_name: str, event_type: str, current_player: int) -> str:
         """Processes and returns a standardized instrument name."""
         instrument_name = instrument_name.lower().replace('"', '')
 
         # If the event type is 'Title_t' or if this is the first declaration, use it as the instrument name
-        if event_type == 'Title_t' or not self.player_instruments.get(current_player, {}).get("instrument"):
+        if event_type == TITLE or not self.player_instruments.get(current_player, {}).get("instrument"):
             return re.sub(r'\s+-?\d+$', '', instrument_name)
 
         # Otherwise, keep the existing instrument name
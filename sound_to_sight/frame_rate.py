@@ -0,0 +1,140 @@
+from fractions import Fraction
+from typing import Iterable
+
+
+MICROSECONDS_PER_SECOND = 1000000
+MICROSECONDS_PER_MINUTE = 60000000
+
+# NTSC rates are exactly 1000/1001 of their nominal integer rate
+NTSC_FRAME_RATES = (Fraction(24000, 1001), Fraction(30000, 1001), Fraction(60000, 1001))
+_NTSC_ALIASES = {'23.976': NTSC_FRAME_RATES[0], '23.98': NTSC_FRAME_RATES[0],
+                 '29.97': NTSC_FRAME_RATES[1], '59.94': NTSC_FRAME_RATES[2]}
+
+
+def to_frame_rate(value) -> Fraction:
+    """
+    Convert a frame rate given as an int, float, string or Fraction into an exact Fraction.
+    The usual decimal spellings of the NTSC rates (23.976, 29.97, 59.94) map to their exact x/1001 values, and a
+    string such as "30000/1001" is read as a fraction.
+
+    Parameters:
+        value: The frame rate.
+
+    Raises:
+        ValueError: If the frame rate is not positive.
+
+    Returns:
+        Fraction: The exact frame rate.
+    """
+    if isinstance(value, Fraction):
+        rate = value
+    else:
+        text = str(value).strip()
+        rate = _NTSC_ALIASES.get(text) or _NTSC_ALIASES.get(text.rstrip('0')) or Fraction(text)
+    if rate <= 0:
+        raise ValueError(f"Frame rate must be positive: {value}")
+    return rate
+
+
+def tempo_from_bpm(bpm: float) -> int:
+    """
+    Recover the MIDI tempo (microseconds per quarter note) from a BPM computed as 60,000,000 / tempo.
+    MIDI tempos are whole microseconds, so rounding removes the floating-point error of the division.
+
+    Parameters:
+        bpm (float): Beats per minute.
+
+    Returns:
+        int: Microseconds per quarter note.
+    """
+    return round(MICROSECONDS_PER_MINUTE / bpm)
+
+
+class FrameRateSolver:
+    """
+    FrameRateSolver Class
+
+    Finds the frame rates at which every measure (or beat) of a piece lasts a whole number of frames. All arithmetic is
+    done with exact fractions over the tempo map, so rates such as 29.97 are tested exactly rather than through a
+    floating-point product. Results are cached per tempo map and time signature, so one solver can be shared by every
+    track of a batch.
+
+    Attributes:
+        candidates (list): The frame rates considered, as Fractions.
+        target (Fraction): The preferred frame rate; valid rates are ranked by their distance from it.
+        per (str): "measure" or "beat", the unit that must span a whole number of frames.
+    """
+
+    def __init__(self, fps_min: int = 24, fps_max: int = 60, include_ntsc: bool = True,
+                 frame_rates: Iterable | None = None, target=None, per: str = 'measure'):
+        """
+        Initialize the solver with its candidate frame rates.
+
+        Parameters:
+            fps_min (int): Lowest frame rate considered when no explicit set is given.
+            fps_max (int): Highest frame rate considered when no explicit set is given.
+            include_ntsc (bool): Also consider the NTSC rates whose nominal rate (e.g. 24 for 23.976) lies between
+                `fps_min` and `fps_max`.
+            frame_rates (Iterable): An explicit set of frame rates to consider instead of the range.
+            target: The preferred frame rate, defaulting to the highest candidate.
+            per (str): "measure" or "beat".
+
+        Raises:
+            ValueError: If `per` is not "measure" or "beat", or no candidate frame rates remain.
+
+        Returns:
+            None
+        """
+        if per not in ('measure', 'beat'):
+            raise ValueError("per must be 'measure' or 'beat'")
+
+        if frame_rates is not None:
+            candidates = {to_frame_rate(rate) for rate in frame_rates}
+        else:
+            candidates = {Fraction(fps) for fps in range(fps_min, fps_max + 1)}
+            if include_ntsc:
+                # Compared by nominal rate, so the default range of 24-60 still includes 23.976
+                candidates.update(rate for rate in NTSC_FRAME_RATES if fps_min <= round(rate) <= fps_max)
+        if not candidates:
+            raise ValueError("No candidate frame rates to choose from.")
+
+        self.candidates = sorted(candidates, reverse=True)
+        self.target = to_frame_rate(target) if target is not None else self.candidates[0]
+        self.per = per
+        self._cache: dict[tuple[tuple[int, ...], int], list[Fraction]] = {}
+
+    def solve(self, tempos: Iterable[int], beats_per_measure: int) -> list[Fraction]:
+        """
+        Return every candidate frame rate that gives a whole number of frames per measure (or beat) at every tempo.
+
+        Parameters:
+            tempos (Iterable[int]): The tempo map, in microseconds per quarter note.
+            beats_per_measure (int): Quarter notes per measure.
+
+        Returns:
+            list[Fraction]: The valid frame rates, closest to the target first (higher rates win ties).
+        """
+        key = (tuple(sorted(set(tempos))), beats_per_measure)
+        if key not in self._cache:
+            # Length of the measure or beat in seconds, for each distinct tempo
+            beats = beats_per_measure if self.per == 'measure' else 1
+            durations = [Fraction(tempo * beats, MICROSECONDS_PER_SECOND) for tempo in key[0]]
+
+            valid = [rate for rate in self.candidates
+                     if all((rate * duration).denominator == 1 for duration in durations)]
+            self._cache[key] = sorted(valid, key=lambda rate: (abs(rate - self.target), -rate))
+        return list(self._cache[key])
+
+    def best(self, tempos: Iterable[int], beats_per_measure: int) -> Fraction | None:
+        """
+        Return the valid frame rate closest to the target, or None if no candidate is valid.
+
+        Parameters:
+            tempos (Iterable[int]): The tempo map, in microseconds per quarter note.
+            beats_per_measure (int): Quarter notes per measure.
+
+        Returns:
+            Fraction | None: The chosen frame rate.
+        """
+        valid = self.solve(tempos, beats_per_measure)
+        return valid[0] if valid else None
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+# Envelopes of the strike animation built by test.jsx, in pattern frames relative to the note's start
+HIT_FRAMES = 6  # The note hit fades from full opacity to nothing over this many frames
+MATTE_PEAK = 75  # Opacity of the instrument diagram matte at the strike
+MATTE_RELEASE = 15  # Frames for the matte to fade back out
+HIT_ENVELOPE = ((0, HIT_FRAMES), (100, 0))
+MATTE_ENVELOPE = ((-1, 0, MATTE_RELEASE), (0, MATTE_PEAK, 0))
+
+# Every note gets the same number of keyframes: one before its start, through the frame after the matte release, so
+# a start that falls between frames is still covered
+KEYFRAME_OFFSETS = np.arange(-1, MATTE_RELEASE + 2)
+DECIMALS = 2
+
+
+def hit_opacity(velocities: np.ndarray) -> np.ndarray:
+    """Peak opacity of the note hit for each velocity, as in test.jsx."""
+    return velocities / 4 + 68
+
+
+def hit_scale(velocities: np.ndarray) -> np.ndarray:
+    """Scale (percent) of the note hit for each velocity, as in test.jsx."""
+    return velocities / 2 + 68
+
+
+def _envelope(times: np.ndarray, envelope: tuple) -> np.ndarray:
+    # Piecewise linear, and zero outside the envelope
+    points, values = envelope
+    return np.interp(times, points, values, left=0, right=0)
+
+
+def compute_keyframes(starts: np.ndarray, velocities: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sample the strike animation of many notes at once on the pattern's frame grid.
+
+    Parameters:
+        starts (np.ndarray): The start of each note, in pattern frames (possibly fractional).
+        velocities (np.ndarray): The velocity of each note.
+
+    Returns:
+        tuple: The first keyframe's frame for each note, and two arrays of shape (notes, len(KEYFRAME_OFFSETS)) with
+        the opacity of the note hit (scaled by velocity) and of the diagram matte at each following frame.
+    """
+    first_frames = np.floor(starts).astype(np.int64) + KEYFRAME_OFFSETS[0]
+    frames = first_frames[:, np.newaxis] + (KEYFRAME_OFFSETS - KEYFRAME_OFFSETS[0])
+    times = frames - starts[:, np.newaxis]
+
+    hit = _envelope(times, HIT_ENVELOPE) / 100 * hit_opacity(velocities)[:, np.newaxis]
+    matte = _envelope(times, MATTE_ENVELOPE)
+    return first_frames, hit, matte
+
+
+def build_keyframes(player_measures_dict, pattern_fps, fps) -> dict:
+    """
+    Precompute the per-frame strike animation of every note, once per distinct pattern.
+
+    All notes of all patterns are sampled in one vectorized pass. test.jsx is authoritative for the timing: like it,
+    each note's start frame (as written to patterns.json) is taken as a frame of the pattern composition, which runs
+    at `pattern_fps`, without rescaling.
+
+    Parameters:
+        player_measures_dict (dict): The parsed player measures.
+        pattern_fps (int | float): Frame rate of the pattern compositions; `fps` is used if it is None.
+        fps (int): Frame rate of the main composition, used for `pattern_fps` if it is None.
+
+    Returns:
+        dict: The document for keyframes.json. For each layout and pattern hash, it holds every note's first keyframe
+        frame, position and hit scale, with its hit and matte opacity at each of `frames` consecutive frames.
+    """
+    pattern_fps = pattern_fps or fps
+
+    # Collect each distinct pattern once, as build_pattern_definitions does
+    patterns = {}
+    for player in player_measures_dict.values():
+        for player_measure in player:
+            patterns.setdefault(player_measure.pattern.hash, player_measure.pattern.notes)
+
+    notes = [note for pattern_notes in patterns.values() for note in pattern_notes]
+    starts = np.array([note.frame_start for note in notes], dtype=np.float64)
+    velocities = np.array([note.velocity for note in notes], dtype=np.float64)
+    first_frames, hit, matte = compute_keyframes(starts, velocities)
+    scales = np.round(hit_scale(velocities), DECIMALS)
+    hit = np.round(hit, DECIMALS)
+    matte = np.round(matte, DECIMALS)
+
+    document = {}
+    end = 0
+    for pattern_hash, pattern_notes in patterns.items():
+        start, end = end, end + len(pattern_notes)
+        if not pattern_notes:
+            continue
+        document.setdefault(pattern_notes[0].layout, {})[pattern_hash] = {
+            'frame': first_frames[start:end].tolist(),
+            'position': [[note.x, note.y] for note in pattern_notes],
+            'scale': scales[start:end].tolist(),
+            'hit': hit[start:end].tolist(),
+            'matte': matte[start:end].tolist(),
+        }
+
+    return {'pattern_fps': pattern_fps,
+            'frames': len(KEYFRAME_OFFSETS),
+            'patterns': {key: dict(sorted(inner_dict.items())) for key, inner_dict in document.items()}}
@@ -0,0 +1,230 @@
+import json
+import os
+from .tokenizer import (HEADER, TEMPO, TIME_SIGNATURE, TITLE, INSTRUMENT_NAME, NOTE_ON, NOTE_OFF, END_TRACK,
+                        scan, event_at, open_buffer, close_buffer)
+
+
+INDEX_SUFFIX = '.s2sidx'
+INDEX_VERSION = 2
+DEFAULT_STRIDE = 16  # Measures between checkpoints
+
+
+class MeasureIndex:
+    """
+    MeasureIndex Class
+
+    A sparse index of byte offsets into a MIDICSV file, used to parse a range of measures without reading the whole
+    file. For every track it records a checkpoint every `stride` measures: the offset of the first row at or after that
+    measure, plus the offsets of the note-on rows still sounding there. It also keeps the header metadata and the
+    offsets of each track's instrument declarations, which a partial parse needs regardless of the range.
+
+    The index is built by one pass over the file on first use and persisted beside it (`<file>.s2sidx`); it is
+    rebuilt whenever the file's size or modification time no longer match.
+
+    Attributes:
+        filename (str): Path to the indexed MIDICSV file.
+        stride (int): Number of measures between checkpoints.
+        division (int): Ticks per quarter note from the Header event.
+        tempo (int): Microseconds per quarter note from the Tempo event.
+        notes_per_bar (int): Numerator of the Time_signature event.
+        total_length (int): Time of the latest End_track event.
+        tracks (list): Track numbers in file order.
+        declarations (dict): Maps each track to the offsets of its Title_t/Instrument_name_t rows.
+        checkpoints (dict): Maps each track to a list of [measure, offset, sounding note-on offsets].
+    """
+
+    def __init__(self, filename: str, stride: int = DEFAULT_STRIDE):
+        self.filename = filename
+        self.stride = stride
+        self.division = None
+        self.tempo = None
+        self.notes_per_bar = None
+        self.total_length = 0
+        self.tracks: list[int] = []
+        self.declarations: dict[int, list[int]] = {}
+        self.checkpoints: dict[int, list[list]] = {}
+        self._source_size = None
+        self._source_mtime = None
+
+    @property
+    def pattern_length(self) -> int:
+        return self.division * self.notes_per_bar
+
+    @property
+    def index_path(self) -> str:
+        return self.filename + INDEX_SUFFIX
+
+    @classmethod
+    def load_or_build(cls, filename: str, stride: int = DEFAULT_STRIDE) -> 'MeasureIndex':
+        """
+        Return the persisted index for a file, building and saving it first if it is missing or stale.
+
+        Parameters:
+            filename (str): Path to the MIDICSV file.
+            stride (int): Number of measures between checkpoints when the index has to be built.
+
+        Returns:
+            MeasureIndex: The index for the file.
+        """
+        index = cls(filename, stride)
+        if index._load():
+            return index
+        index.build()
+        try:
+            index.save()
+        except OSError:
+            pass  # A read-only location only costs rebuilding the index next time
+        return index
+
+    def build(self):
+        """
+        Scan the file once and record the header metadata, declarations and per-track checkpoints.
+
+        Raises:
+            ValueError: If a note event appears before the Header, Tempo and Time_signature events.
+
+        Returns:
+            None
+        """
+        stat = os.stat(self.filename)
+        self._source_size, self._source_mtime = stat.st_size, stat.st_mtime_ns
+
+        track = None
+        next_checkpoint = 1
+        sounding: dict[int, list[int]] = {}  # Note value -> offsets of note-on rows without a note-off yet
+        notes_reached = False
+
+        buffer = open_buffer(self.filename)
+        try:
+            for offset, event in scan(buffer):
+                event_type, row_track, time = event[0], event[1], event[2]
+
+                if row_track != track:
+                    track = row_track
+                    next_checkpoint = 1
+                    sounding = {}
+                    if track not in self.declarations:
+                        self.tracks.append(track)
+                        self.declarations[track] = []
+                        self.checkpoints[track] = []
+
+                if event_type == NOTE_ON or event_type == NOTE_OFF:
+                    if not notes_reached:
+                        # Metadata is read up to the first note, as in MidiCsvParser._parse_header
+                        if not all([self.division, self.tempo, self.notes_per_bar]):
+                            raise ValueError('Incomplete metadata, please check the MIDI CSV file')
+                        notes_reached = True
+                    measure = (time // self.pattern_length) + 1
+
+                    # Record a checkpoint for every stride boundary reached by this event
+                    while measure >= next_checkpoint:
+                        carried = sorted(o for offsets in sounding.values() for o in offsets)
+                        self.checkpoints[track].append([next_checkpoint, offset, carried])
+                        next_checkpoint += self.stride
+
+                    note_value = event[3]
+                    if event_type == NOTE_ON:
+                        sounding.setdefault(note_value, []).append(offset)
+                    elif sounding.get(note_value):
+                        sounding[note_value].pop(0)
+                elif event_type == TITLE or event_type == INSTRUMENT_NAME:
+                    self.declarations[track].append(offset)
+                elif event_type == END_TRACK:
+                    self.total_length = max(self.total_length, time)
+                elif notes_reached:
+                    continue
+                elif event_type == HEADER:
+                    self.division = event[3]
+                elif event_type == TEMPO:
+                    self.tempo = event[3]
+                elif event_type == TIME_SIGNATURE:
+                    self.notes_per_bar = event[3]
+        finally:
+            close_buffer(buffer)
+
+        if not all([self.division, self.tempo, self.notes_per_bar]):
+            raise ValueError('Incomplete metadata, please check the MIDI CSV file')
+
+    def locate(self, buffer, track: int, measure: int) -> tuple[int | None, list[int]]:
+        """
+        Find where a track reaches a measure, and which notes are still sounding there.
+        Starts from the nearest checkpoint at or before the measure and scans forward from it.
+
+        Parameters:
+            buffer: The MIDICSV file contents, as returned by `tokenizer.open_buffer`.
+            track (int): The track number.
+            measure (int): The 1-based measure number.
+
+        Returns:
+            tuple: The offset of the track's first note row at or after the measure (None if the track has no notes
+            there), and the offsets of the note-on rows still sounding at that point, in file order.
+        """
+        checkpoints = self.checkpoints.get(track)
+        if not checkpoints:
+            return None, []
+
+        # Checkpoints are stride-aligned, so the nearest one can be found arithmetically
+        position = min((measure - 1) // self.stride, len(checkpoints) - 1)
+        _, offset, carried = checkpoints[position]
+
+        sounding: dict[int, list[int]] = {}
+        for carried_offset in carried:
+            sounding.setdefault(event_at(buffer, carried_offset)[3], []).append(carried_offset)
+
+        for offset, event in scan(buffer, offset):
+            event_type = event[0]
+            if event[1] != track or event_type == END_TRACK:
+                break
+            if event_type == NOTE_ON or event_type == NOTE_OFF:
+                if (event[2] // self.pattern_length) + 1 >= measure:
+                    return offset, sorted(o for offsets in sounding.values() for o in offsets)
+                if event_type == NOTE_ON:
+                    sounding.setdefault(event[3], []).append(offset)
+                elif sounding.get(event[3]):
+                    sounding[event[3]].pop(0)
+        return None, []
+
+    def save(self):
+        """Write the index beside the indexed file."""
+        data = {'version': INDEX_VERSION,
+                'source_size': self._source_size,
+                'source_mtime': self._source_mtime,
+                'stride': self.stride,
+                'division': self.division,
+                'tempo': self.tempo,
+                'notes_per_bar': self.notes_per_bar,
+                'total_length': self.total_length,
+                'tracks': self.tracks,
+                'declarations': self.declarations,
+                'checkpoints': self.checkpoints}
+        with open(self.index_path, 'w') as json_file:
+            json.dump(data, json_file)
+
+    def _load(self) -> bool:
+        """
+        Load the persisted index if it exists and still matches the file.
+
+        Returns:
+            bool: True if a current index was loaded.
+        """
+        try:
+            with open(self.index_path, 'r') as json_file:
+                data = json.load(json_file)
+            stat = os.stat(self.filename)
+        except (OSError, ValueError):
+            return False
+
+        if (data.get('version') != INDEX_VERSION or data.get('source_size') != stat.st_size
+                or data.get('source_mtime') != stat.st_mtime_ns):
+            return False
+
+        self._source_size, self._source_mtime = stat.st_size, stat.st_mtime_ns
+        self.stride = data['stride']
+        self.division = data['division']
+        self.tempo = data['tempo']
+        self.notes_per_bar = data['notes_per_bar']
+        self.total_length = data['total_length']
+        self.tracks = data['tracks']
+        self.declarations = {int(track): offsets for track, offsets in data['declarations'].items()}
+        self.checkpoints = {int(track): checkpoints for track, checkpoints in data['checkpoints'].items()}
+        return True
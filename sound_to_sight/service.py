@@ -0,0 +1,331 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from .csv_reader import MidiCsvParser, Resources
+from .frame_rate import FrameRateSolver
+from .main import MIN_FPS, MAX_FPS
+from .utils import (build_timeline, build_player_definitions, build_pattern_definitions, build_project_details,
+                    calculate_fps, music_to_video_length, sections_to_video_time)
+
+
+DEFAULT_RESOLUTION = (3840, 2160)
+MAX_BODY_BYTES = 64 * 1024 * 1024
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 422: 'Unprocessable Entity', 500: 'Internal Server Error',
+                503: 'Service Unavailable'}
+
+# Resources loaded once per worker process by _warm_worker
+_resources: Resources | None = None
+
+# Frame rate results are cached per tempo map, so one solver serves every request handled by a worker
+_frame_rates = FrameRateSolver(MIN_FPS, MAX_FPS)
+
+
+class RequestError(Exception):
+    """Raised for a malformed request; carries the HTTP status code to answer with."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _warm_worker():
+    """
+    Worker process initializer.
+    Loads the supported instruments, layouts and note symbols once so that every request handled by this worker
+    reuses them instead of reading the JSON resources again.
+
+    Returns:
+        None
+    """
+    global _resources
+    _resources = Resources()
+
+
+def _worker_ready() -> int:
+    """Return the worker's process id; submitted once per worker at start-up to spawn and warm the pool."""
+    return os.getpid()
+
+
+def _smf_to_csv(midi_path: str, csv_path: str):
+    """
+    Convert a Standard MIDI File to the MIDICSV text format using the `midicsv` tool.
+
+    Parameters:
+        midi_path (str): Path to the uploaded .mid file.
+        csv_path (str): Path the converted CSV is written to.
+
+    Raises:
+        RuntimeError: If `midicsv` is not installed.
+        ValueError: If `midicsv` fails to convert the file.
+
+    Returns:
+        None
+    """
+    midicsv = shutil.which('midicsv')
+    if midicsv is None:
+        raise RuntimeError("SMF uploads require the 'midicsv' tool to be installed and on the PATH.")
+    result = subprocess.run([midicsv, midi_path, csv_path], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ValueError(f"midicsv failed to convert the upload: {result.stderr.strip()}")
+
+
+def parse_upload(data: bytes, upload_format: str, fps: int, sections: list[int],
+                 video_resolution: tuple[int, int]) -> tuple[bytes, float]:
+    """
+    Parse an uploaded MIDI-CSV or SMF file and build the four export documents.
+    Runs inside a pool worker, using the resources loaded by `_warm_worker`.
+
+    Parameters:
+        data (bytes): The uploaded file contents.
+        upload_format (str): "csv" for MIDICSV text, "smf" for a Standard MIDI File.
+        fps (int): Frames per second of the video.
+        sections (list): Bar numbers at which sections start.
+        video_resolution (tuple): Width and height of the video.
+
+    Returns:
+        tuple[bytes, float]: The JSON-encoded documents and the time spent parsing, in seconds.
+    """
+    start = time.perf_counter()
+    resources = _resources if _resources is not None else Resources()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, 'upload.csv')
+        if upload_format == 'smf':
+            midi_path = os.path.join(tmp_dir, 'upload.mid')
+            with open(midi_path, 'wb') as f:
+                f.write(data)
+            _smf_to_csv(midi_path, csv_path)
+        else:
+            with open(csv_path, 'wb') as f:
+                f.write(data)
+
+        # Workers have no stdin to prompt on, so an instrument without a layout is reported as a ValueError (422)
+        midi_parser = MidiCsvParser(csv_path, fps, list(sections), resources, interactive=False)
+        music, sections, bpm, notes_per_bar, division, total_length = midi_parser.parse()
+
+    pattern_fps = calculate_fps(bpm, notes_per_bar, MIN_FPS, MAX_FPS, midi_parser.tempo_map, _frame_rates)
+    project_length = music_to_video_length(total_length, bpm, division)
+    sections = [sections_to_video_time(x * notes_per_bar, bpm) for x in sections]
+    pattern_length = music_to_video_length(notes_per_bar * division, bpm, division)
+
+    documents = {'timeline': build_timeline(music),
+                 'patterns': build_pattern_definitions(music),
+                 'players': build_player_definitions(music),
+                 'project_detail': build_project_details(pattern_fps, project_length, sections, pattern_length,
+                                                         fps, video_resolution)}
+    return json.dumps(documents).encode(), time.perf_counter() - start
+
+
+def _parse_query(query: str, content_type: str) -> tuple[str, int, list[int], tuple[int, int]]:
+    """
+    Read the parse options from the request query string.
+
+    Parameters:
+        query (str): The raw query string, e.g. "fps=60&sections=329,676&format=csv&resolution=3840x2160".
+        content_type (str): The request Content-Type, used to detect SMF uploads when no format is given.
+
+    Raises:
+        RequestError: If an option is missing or malformed.
+
+    Returns:
+        tuple: The upload format, fps, section bar numbers and video resolution.
+    """
+    params = {key: values[-1] for key, values in parse_qs(query).items()}
+    try:
+        fps = int(params['fps'])
+        sections = [int(x) for x in params.get('sections', '').replace(',', ' ').split()]
+        if 'resolution' in params:
+            width, height = (int(x) for x in params['resolution'].lower().split('x'))
+            video_resolution = (width, height)
+        else:
+            video_resolution = DEFAULT_RESOLUTION
+    except KeyError:
+        raise RequestError(400, "Missing required query parameter 'fps'.")
+    except ValueError:
+        raise RequestError(400, "Query parameters 'fps', 'sections' and 'resolution' must be integers.")
+
+    upload_format = params.get('format')
+    if upload_format is None:
+        upload_format = 'smf' if content_type.split(';')[0].strip() in ('audio/midi', 'audio/x-midi') else 'csv'
+    if upload_format not in ('csv', 'smf'):
+        raise RequestError(400, "Query parameter 'format' must be 'csv' or 'smf'.")
+
+    return upload_format, fps, sections, video_resolution
+
+
+class ParseService:
+    """
+    ParseService Class
+
+    A small HTTP/1.1 server, listening on TCP or a Unix socket, that parses uploads in a pool of pre-warmed worker
+    processes and answers with the timeline, patterns, players and project_detail documents in one JSON object.
+
+    Endpoints:
+        POST /parse?fps=60&sections=329,676[&format=csv|smf][&resolution=3840x2160]  (body: the file)
+        GET /health
+
+    Every /parse response carries `X-Queue-Time`, `X-Parse-Time` and a `Server-Timing` header (milliseconds).
+
+    Attributes:
+        workers (int): Number of worker processes in the pool.
+        max_concurrency (int): Maximum number of uploads parsed at the same time.
+        max_pending (int): Maximum number of uploads waiting or parsing before new ones are refused with 503.
+    """
+
+    def __init__(self, workers: int | None = None, max_concurrency: int | None = None, max_pending: int = 64):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.workers
+        self.max_pending = max_pending
+        self.executor: ProcessPoolExecutor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._pending = 0
+
+    async def warm_up(self):
+        """Start every worker process and load its resources before the first request arrives."""
+        loop = asyncio.get_running_loop()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _worker_ready) for _ in range(self.workers)))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765, unix_path: str | None = None):
+        """
+        Warm the pool and serve requests until cancelled.
+
+        Parameters:
+            host (str): TCP host to bind, ignored when `unix_path` is given.
+            port (int): TCP port to bind, ignored when `unix_path` is given.
+            unix_path (str): Path of a Unix domain socket to listen on instead of TCP.
+
+        Returns:
+            None
+        """
+        await self.warm_up()
+        try:
+            if unix_path:
+                server = await asyncio.start_unix_server(self._handle_connection, path=unix_path)
+                print(f"Serving on unix:{unix_path} with {self.workers} workers.")
+            else:
+                server = await asyncio.start_server(self._handle_connection, host, port)
+                print(f"Serving on http://{host}:{port} with {self.workers} workers.")
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        received = time.perf_counter()
+        try:
+            try:
+                status, body, headers = await self._handle_request(reader, received)
+            except RequestError as e:
+                status, body, headers = e.status, json.dumps({'error': str(e)}).encode(), {}
+            except ValueError as e:
+                status, body, headers = 422, json.dumps({'error': str(e)}).encode(), {}
+            except Exception as e:
+                status, body, headers = 500, json.dumps({'error': str(e)}).encode(), {}
+            await self._write_response(writer, status, body, headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader: asyncio.StreamReader, received: float) -> tuple[int, bytes, dict]:
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        try:
+            method, target, _ = request_line.split(' ', 2)
+        except ValueError:
+            raise RequestError(400, "Malformed request line.")
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        url = urlsplit(target)
+        if url.path == '/health':
+            return 200, json.dumps({'status': 'ok', 'workers': self.workers, 'pending': self._pending}).encode(), {}
+        if url.path != '/parse':
+            raise RequestError(404, f"Unknown path: {url.path}")
+        if method != 'POST':
+            raise RequestError(405, "Use POST to upload a file to /parse.")
+
+        try:
+            length = int(headers.get('content-length', ''))
+        except ValueError:
+            raise RequestError(400, "A Content-Length header is required.")
+        if length > MAX_BODY_BYTES:
+            raise RequestError(413, f"Uploads are limited to {MAX_BODY_BYTES} bytes.")
+
+        upload_format, fps, sections, video_resolution = _parse_query(url.query, headers.get('content-type', ''))
+        data = await reader.readexactly(length)
+
+        if self._pending >= self.max_pending:
+            return 503, json.dumps({'error': 'Too many pending requests.'}).encode(), {'Retry-After': '1'}
+
+        self._pending += 1
+        try:
+            async with self._semaphore:
+                queued = time.perf_counter()
+                loop = asyncio.get_running_loop()
+                body, parse_time = await loop.run_in_executor(self.executor, parse_upload, data, upload_format,
+                                                              fps, sections, video_resolution)
+        finally:
+            self._pending -= 1
+
+        queue_ms = (queued - received) * 1000
+        parse_ms = parse_time * 1000
+        total_ms = (time.perf_counter() - received) * 1000
+        timing = {'X-Queue-Time': f"{queue_ms:.3f}",
+                  'X-Parse-Time': f"{parse_ms:.3f}",
+                  'Server-Timing': f"queue;dur={queue_ms:.3f}, parse;dur={parse_ms:.3f}, total;dur={total_ms:.3f}"}
+        return 200, body, timing
+
+    @staticmethod
+    async def _write_response(writer: asyncio.StreamWriter, status: int, body: bytes, headers: dict):
+        head = [f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}",
+                'Content-Type: application/json',
+                f"Content-Length: {len(body)}",
+                'Connection: close']
+        head.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Serve MIDI parsing requests from a pool of warm workers.")
+    parser.add_argument('--host', default='127.0.0.1', help="TCP host to bind.")
+    parser.add_argument('-p', '--port', type=int, default=8765, help="TCP port to bind.")
+    parser.add_argument('-u', '--unix', default=None, help="Listen on this Unix socket path instead of TCP.")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Number of worker processes.")
+    parser.add_argument('-c', '--max_concurrency', type=int, default=None,
+                        help="Maximum number of uploads parsed at once (defaults to the number of workers).")
+    parser.add_argument('-q', '--max_pending', type=int, default=64,
+                        help="Maximum number of queued uploads before responding with 503.")
+    args = parser.parse_args(argv)
+
+    service = ParseService(args.workers, args.max_concurrency, args.max_pending)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,10 @@ setup(
     author_email='jeffheller@jhgfd.com',
     packages=find_packages(),
     install_requires=['BPMtoFPS'],
+    extras_require={'keyframes': ['numpy']},
     entry_points={
         'console_scripts': [
-            'sound_to_sight = sound_to_sight.main:main',
+            'sound_to_sight = sound_to_sight.cli:main',
         ],
     },
     url="https://github.com/JHGFD82/sound_to_sight",
@@ -0,0 +1,153 @@
+import random
+from collections import defaultdict
+
+import mmh3
+
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _note_feature(note) -> tuple:
+    """The fields that make two notes interchangeable within a pattern, as used by Pattern.calculate_hash."""
+    return note.measure_time, note.note_value, note.velocity, note.length
+
+
+def _note_row(note) -> list:
+    """A note in the same form as the rows of patterns.json."""
+    return [note.frame_start, note.note_value, note.velocity, note.frame_duration, [note.x, note.y]]
+
+
+class MinHasher:
+    """
+    MinHasher Class
+
+    Computes MinHash signatures of note sets. Each note feature is hashed once with mmh3 and then mapped through
+    `num_perm` random universal hash functions; the signature keeps the minimum of each. The probability that two
+    signatures agree at a position equals the Jaccard similarity of the two note sets.
+
+    Attributes:
+        num_perm (int): Length of each signature.
+    """
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, seed: int = 1):
+        self.num_perm = num_perm
+        rng = random.Random(seed)
+        self._permutations = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                              for _ in range(num_perm)]
+
+    def signature(self, features) -> tuple[int, ...]:
+        """
+        Return the MinHash signature of a set of note features.
+
+        Parameters:
+            features (Iterable[tuple]): The note features of one pattern.
+
+        Returns:
+            tuple[int, ...]: The signature.
+        """
+        hashes = [mmh3.hash('_'.join(map(str, feature)), signed=False) for feature in features]
+        if not hashes:
+            return (_MAX_HASH,) * self.num_perm
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) & _MAX_HASH
+                     for a, b in self._permutations)
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def find_pattern_clusters(player_measures_dict, threshold: float = DEFAULT_THRESHOLD,
+                          num_perm: int = DEFAULT_NUM_PERM, bands: int = DEFAULT_BANDS) -> list[dict]:
+    """
+    Group near-duplicate patterns around a base pattern, so a renderer can reuse the base and redraw only the diff.
+
+    Signatures are split into `bands` bands and patterns sharing any band (within the same layout) become candidates,
+    so only likely matches are compared rather than every pair. Candidates are then confirmed with their exact Jaccard
+    similarity. Patterns are visited from most to least played; each one not yet assigned becomes a base, and every
+    unassigned candidate at least `threshold` similar to it becomes one of its variants.
+
+    Parameters:
+        player_measures_dict (dict): The parsed player measures.
+        threshold (float): Minimum Jaccard similarity between a variant and its base.
+        num_perm (int): MinHash signature length; must be divisible by `bands`.
+        bands (int): Number of LSH bands.
+
+    Raises:
+        ValueError: If `num_perm` is not divisible by `bands`.
+
+    Returns:
+        list[dict]: One entry per cluster with at least one variant, holding the layout, the base pattern hash and, for
+        each variant hash, its similarity and the notes added to and removed from the base (as patterns.json rows).
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm must be divisible by bands")
+    rows_per_band = num_perm // bands
+
+    # Collect each distinct pattern once, with how often it is played
+    patterns = {}
+    occurrences = defaultdict(int)
+    for player in player_measures_dict.values():
+        for player_measure in player:
+            pattern = player_measure.pattern
+            patterns.setdefault(pattern.hash, pattern)
+            occurrences[pattern.hash] += player_measure.play_count
+
+    hasher = MinHasher(num_perm)
+    features = {}
+    layouts = {}
+    buckets = defaultdict(list)
+    for pattern_hash, pattern in patterns.items():
+        features[pattern_hash] = {_note_feature(note): note for note in pattern.notes}
+        layouts[pattern_hash] = pattern.notes[0].layout if pattern.notes else None
+        signature = hasher.signature(features[pattern_hash])
+        for band in range(bands):
+            band_key = signature[band * rows_per_band:(band + 1) * rows_per_band]
+            buckets[(layouts[pattern_hash], band, band_key)].append(pattern_hash)
+
+    candidates = defaultdict(set)
+    for members in buckets.values():
+        if len(members) > 1:
+            for pattern_hash in members:
+                candidates[pattern_hash].update(members)
+
+    clusters = []
+    assigned = set()
+    for base_hash in sorted(patterns, key=lambda h: (-occurrences[h], h)):
+        if base_hash in assigned:
+            continue
+        assigned.add(base_hash)
+        base_notes = features[base_hash]
+        base_set = set(base_notes)
+
+        variants = {}
+        for variant_hash in sorted(candidates[base_hash] - assigned):
+            variant_notes = features[variant_hash]
+            similarity = _jaccard(base_set, set(variant_notes))
+            if similarity < threshold:
+                continue
+            assigned.add(variant_hash)
+            variants[variant_hash] = {
+                'similarity': round(similarity, 4),
+                'added': [_note_row(variant_notes[f]) for f in sorted(variant_notes.keys() - base_set)],
+                'removed': [_note_row(base_notes[f]) for f in sorted(base_set - variant_notes.keys())],
+            }
+
+        if variants:
+            clusters.append({'layout': layouts[base_hash], 'base': base_hash, 'variants': variants})
+
+    return clusters
+
+
+def build_pattern_clusters(player_measures_dict, threshold: float = DEFAULT_THRESHOLD):
+    """Return the pattern clusters as a document keyed by layout and base pattern hash, like patterns.json."""
+    document = {}
+    for cluster in find_pattern_clusters(player_measures_dict, threshold):
+        document.setdefault(cluster['layout'], {})[cluster['base']] = cluster['variants']
+    return document
@@ -0,0 +1,358 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from collections.abc import Mapping, MutableMapping, Sequence
+from .models import Note, PlayerMeasure
+
+
+BATCH_SIZE = 1000  # Player measures buffered before they are written to the database
+
+# Columns holding values that may be ints or floats are left untyped, so SQLite stores them exactly as given and the
+# exported JSON is the same as for an in-memory parse
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    player INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS player_measures (
+    player INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    measure_number INTEGER NOT NULL,
+    section_number INTEGER NOT NULL,
+    instrument TEXT,
+    footage TEXT,
+    pattern_hash INTEGER NOT NULL,
+    play_count INTEGER NOT NULL,
+    frame_start,
+    PRIMARY KEY (player, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS notes (
+    pattern_hash INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    start_time INTEGER NOT NULL,
+    measure_time INTEGER NOT NULL,
+    note_value INTEGER NOT NULL,
+    velocity INTEGER NOT NULL,
+    note_name TEXT,
+    layout TEXT,
+    x,
+    y,
+    length INTEGER,
+    frame_start,
+    frame_duration,
+    PRIMARY KEY (pattern_hash, position)
+) WITHOUT ROWID;
+"""
+
+
+class MeasureStore:
+    """
+    MeasureStore Class
+
+    An on-disk store for the player measures of a parse, used to keep memory bounded on large projects. Finalized
+    player measures are appended as soon as their measure closes, and the notes of each distinct pattern are written
+    once. After the parse, `player_measures()` reads them back in their original order through the same interface as
+    the in-memory result, so the exporters work on either.
+
+    The store is an SQLite database. Without a path it lives in a temporary file that is deleted on `close()`; a
+    given path must not already hold data, so an existing file is never overwritten.
+
+    Attributes:
+        path (str): Path to the database file.
+    """
+
+    def __init__(self, path: str | None = None):
+        """
+        Create the store.
+
+        Parameters:
+            path (str): Path to a new (or empty) database file, or None for a temporary file.
+
+        Raises:
+            FileExistsError: If `path` is a file that is not empty.
+
+        Returns:
+            None
+        """
+        self._temporary = path is None
+        if self._temporary:
+            fd, path = tempfile.mkstemp(prefix='sound_to_sight.', suffix='.sqlite')
+            os.close(fd)
+        elif os.path.isfile(path) and os.path.getsize(path) > 0:
+            raise FileExistsError(f"Refusing to overwrite the existing file: {path}")
+        self.path = path
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        # The store is scratch data rebuilt by every parse, so durability is traded for write speed
+        self._connection.execute('PRAGMA journal_mode = OFF')
+        self._connection.execute('PRAGMA synchronous = OFF')
+        self._connection.executescript(_SCHEMA)
+
+        self._positions: dict[int, int] = {}  # Player number -> number of its player measures written
+        self._written_patterns: set[int] = set()
+        self._pending_measures: list[tuple] = []
+        self._pending_notes: list[tuple] = []
+        self._readers = threading.local()
+        self._reader_connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'MeasureStore':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def spill(self) -> 'SpilledPlayerMeasures':
+        """Return an empty player measures mapping for a parser, which spills its finalized entries to this store."""
+        return SpilledPlayerMeasures(self)
+
+    def append(self, player_measure: PlayerMeasure):
+        """
+        Add a finalized player measure, and its pattern's notes if that pattern has not been stored yet.
+
+        Parameters:
+            player_measure (PlayerMeasure): The player measure; it must no longer change.
+
+        Returns:
+            None
+        """
+        player = player_measure.player_number
+        if player not in self._positions:
+            self._connection.execute('INSERT INTO players VALUES (?, ?)', (player, len(self._positions)))
+            self._positions[player] = 0
+        position = self._positions[player]
+        self._positions[player] += 1
+
+        pattern = player_measure.pattern
+        self._pending_measures.append((player, position, player_measure.measure_number,
+                                       player_measure.section_number, player_measure.instrument,
+                                       player_measure.footage, pattern.hash, player_measure.play_count,
+                                       player_measure.frame_start))
+
+        if pattern.hash not in self._written_patterns:
+            self._written_patterns.add(pattern.hash)
+            self._pending_notes.extend((pattern.hash, i, note.start_time, note.measure_time, note.note_value,
+                                        note.velocity, note.note_name, note.layout, note.x, note.y, note.length,
+                                        getattr(note, 'frame_start', None), getattr(note, 'frame_duration', None))
+                                       for i, note in enumerate(pattern.notes))
+
+        if len(self._pending_measures) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered player measures and notes to the database."""
+        with self._connection:
+            self._connection.executemany('INSERT INTO player_measures VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                         self._pending_measures)
+            self._connection.executemany('INSERT OR IGNORE INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                         self._pending_notes)
+        self._pending_measures = []
+        self._pending_notes = []
+
+    def player_measures(self) -> 'StoredPlayerMeasures':
+        """Flush the store and return a read-only view of its player measures, keyed by player number."""
+        self.flush()
+        return StoredPlayerMeasures(self)
+
+    def close(self):
+        """Close every connection, deleting the database if it is temporary."""
+        with self._lock:
+            for connection in self._reader_connections:
+                connection.close()
+            self._reader_connections = []
+        self._readers = threading.local()
+        self._connection.close()
+        if self._temporary:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def _query(self, sql: str, parameters: tuple = ()) -> sqlite3.Cursor:
+        # The exporters read concurrently from a thread pool, so every thread gets its own connection
+        connection = getattr(self._readers, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._readers.connection = connection
+            with self._lock:
+                self._reader_connections.append(connection)
+        return connection.execute(sql, parameters)
+
+    def _player_lengths(self) -> list[tuple[int, int]]:
+        return self._query('SELECT player, COUNT(m.position) FROM players LEFT JOIN player_measures AS m '
+                           'USING (player) GROUP BY player ORDER BY players.position').fetchall()
+
+    def _notes(self, pattern_hash: int) -> list[Note]:
+        notes = []
+        for row in self._query('SELECT start_time, measure_time, note_value, velocity, note_name, layout, x, y, '
+                               'length, frame_start, frame_duration FROM notes WHERE pattern_hash = ? '
+                               'ORDER BY position', (pattern_hash,)):
+            note = Note(*row[:8])
+            note.length = row[8]
+            note.frame_start, note.frame_duration = row[9], row[10]
+            notes.append(note)
+        return notes
+
+    def _player_measure(self, row: tuple) -> PlayerMeasure:
+        player, measure_number, section_number, instrument, footage, pattern_hash, play_count, frame_start = row
+        player_measure = PlayerMeasure(measure_number, section_number, player, instrument, footage,
+                                       StoredPattern(self, pattern_hash, instrument, footage))
+        player_measure.play_count = play_count
+        player_measure.frame_start = frame_start
+        return player_measure
+
+    def _player_measure_rows(self, player: int, offset: int = 0, limit: int = -1) -> sqlite3.Cursor:
+        return self._query('SELECT player, measure_number, section_number, instrument, footage, pattern_hash, '
+                           'play_count, frame_start FROM player_measures WHERE player = ? ORDER BY position '
+                           'LIMIT ? OFFSET ?', (player, limit, offset))
+
+
+class StoredPattern:
+    """
+    StoredPattern Class
+
+    A pattern read back from a MeasureStore. Its notes are only loaded when first accessed, so exporters that need
+    only the hash (such as the timeline) never read them.
+
+    Attributes:
+        hash (int): The pattern hash.
+        instrument (str): The instrument playing the pattern.
+        footage (str): The footage associated with the pattern.
+    """
+
+    def __init__(self, store: MeasureStore, pattern_hash: int, instrument: str, footage: str):
+        self.hash = pattern_hash
+        self.instrument = instrument
+        self.footage = footage
+        self._store = store
+        self._notes = None
+
+    @property
+    def notes(self) -> list[Note]:
+        if self._notes is None:
+            self._notes = self._store._notes(self.hash)
+        return self._notes
+
+
+class _SpilledPlayer:
+    """The player measures of one player during a spilled parse; only the latest stays in memory."""
+
+    def __init__(self, store: MeasureStore, player_measures: list[PlayerMeasure]):
+        self._store = store
+        self._latest = None
+        for player_measure in player_measures:
+            self.append(player_measure)
+
+    def __getitem__(self, index: int) -> PlayerMeasure:
+        # Pattern.finalize only looks at the latest player measure, which may still have its play count raised
+        if index != -1 or self._latest is None:
+            raise IndexError('Only the latest player measure of a spilled player is available')
+        return self._latest
+
+    def append(self, player_measure: PlayerMeasure):
+        if self._latest is not None:
+            self._store.append(self._latest)
+        self._latest = player_measure
+
+    def close(self):
+        if self._latest is not None:
+            self._store.append(self._latest)
+            self._latest = None
+
+
+class SpilledPlayerMeasures(MutableMapping):
+    """
+    SpilledPlayerMeasures Class
+
+    The player measures mapping of a parse that spills to a MeasureStore. It behaves like the parser's usual dict of
+    per-player lists for Pattern.finalize, but each player keeps only its latest player measure in memory: once a
+    newer one is appended, the previous one can no longer change and is written to the store.
+
+    Attributes:
+        store (MeasureStore): The store receiving the finalized player measures.
+    """
+
+    def __init__(self, store: MeasureStore):
+        self.store = store
+        self._players: dict[int, _SpilledPlayer] = {}
+
+    def __getitem__(self, player: int) -> _SpilledPlayer:
+        return self._players[player]
+
+    def __setitem__(self, player: int, player_measures: list[PlayerMeasure]):
+        if player in self._players:
+            self._players[player].close()
+        self._players[player] = _SpilledPlayer(self.store, player_measures)
+
+    def __delitem__(self, player: int):
+        raise TypeError('Spilled player measures cannot be removed')
+
+    def __iter__(self):
+        return iter(self._players)
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def close(self) -> 'StoredPlayerMeasures':
+        """
+        Write the latest player measure of every player to the store.
+
+        Returns:
+            StoredPlayerMeasures: The complete player measures, read back from the store.
+        """
+        for spilled_player in self._players.values():
+            spilled_player.close()
+        return self.store.player_measures()
+
+
+class StoredPlayer(Sequence):
+    """The player measures of one player, read back from a MeasureStore in their original order."""
+
+    def __init__(self, store: MeasureStore, player: int, length: int):
+        self._store = store
+        self._player = player
+        self._length = length
+
+    def __getitem__(self, index: int) -> PlayerMeasure:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('player measure index out of range')
+        row = self._store._player_measure_rows(self._player, index, 1).fetchone()
+        return self._store._player_measure(row)
+
+    def __iter__(self):
+        # Stream the rows rather than loading the whole player at once
+        for row in self._store._player_measure_rows(self._player):
+            yield self._store._player_measure(row)
+
+    def __len__(self) -> int:
+        return self._length
+
+
+class StoredPlayerMeasures(Mapping):
+    """
+    StoredPlayerMeasures Class
+
+    A read-only view of the player measures in a MeasureStore, keyed by player number in the order the players were
+    first finalized, like the dict returned by an in-memory parse. Player measures are read from disk on iteration.
+
+    Attributes:
+        store (MeasureStore): The store being read.
+    """
+
+    def __init__(self, store: MeasureStore):
+        self.store = store
+        self._players = {player: StoredPlayer(store, player, length) for player, length in store._player_lengths()}
+
+    def __getitem__(self, player: int) -> StoredPlayer:
+        return self._players[player]
+
+    def __iter__(self):
+        return iter(self._players)
+
+    def __len__(self) -> int:
+        return len(self._players)
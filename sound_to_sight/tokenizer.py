@@ -0,0 +1,156 @@
+import mmap
+import re
+from typing import Iterator
+
+
+# Event types yielded by the tokenizer, matching the MIDICSV record names. Compare them with ==, not `is`: events that
+# have been pickled (e.g. sent to a worker process) or loaded from JSON hold equal but distinct strings.
+HEADER = 'Header'
+TEMPO = 'Tempo'
+TIME_SIGNATURE = 'Time_signature'
+TITLE = 'Title_t'
+INSTRUMENT_NAME = 'Instrument_name_t'
+NOTE_ON = 'Note_on_c'
+NOTE_OFF = 'Note_off_c'
+END_TRACK = 'End_track'
+
+_EVENT_NAMES = {name.encode(): name for name in
+                (HEADER, TEMPO, TIME_SIGNATURE, TITLE, INSTRUMENT_NAME, NOTE_ON, NOTE_OFF, END_TRACK)}
+
+# One match per line of interest; every other record type is skipped inside the regex engine without building a row
+EVENT_PATTERN = re.compile(
+    rb'^[ \t]*(\d+)[ \t]*,[ \t]*(\d+)[ \t]*,[ \t]*(' + b'|'.join(_EVENT_NAMES) + rb')[ \t]*(?=[,\r\n]|$),?([^\r\n]*)',
+    re.MULTILINE)
+
+
+def _to_event(match: re.Match) -> tuple:
+    """
+    Convert a matched line into a typed event tuple.
+    Every event starts with (event_type, track, time); the remaining fields depend on the event type:
+
+        Note_on_c: note value, velocity
+        Note_off_c: note value
+        Title_t, Instrument_name_t: the raw text field
+        Tempo: microseconds per quarter note
+        Time_signature: numerator (beats per bar)
+        Header: division (ticks per quarter note)
+        End_track: nothing
+
+    Parameters:
+        match (re.Match): A match of `EVENT_PATTERN`.
+
+    Returns:
+        tuple: The typed event.
+    """
+    track, time, name, payload = match.groups()
+    event_type = _EVENT_NAMES[name]
+    track, time = int(track), int(time)
+
+    if event_type == NOTE_ON:
+        _, note_value, velocity = payload.split(b',')
+        return event_type, track, time, int(note_value), int(velocity)
+    if event_type == NOTE_OFF:
+        return event_type, track, time, int(payload.split(b',')[1])
+    if event_type == TITLE or event_type == INSTRUMENT_NAME:
+        return event_type, track, time, payload.strip().decode(errors='replace')
+    if event_type == END_TRACK:
+        return event_type, track, time
+    if event_type == HEADER:
+        return event_type, track, time, int(payload.split(b',')[2])
+    # Tempo and Time_signature both need only their first field
+    return event_type, track, time, int(payload.split(b',', 1)[0])
+
+
+def scan(buffer, pos: int = 0) -> Iterator[tuple[int, tuple]]:
+    """
+    Yield the byte offset and typed event of every line of interest in a buffer, starting at `pos`.
+
+    Parameters:
+        buffer: A bytes-like object or mmap holding MIDICSV text.
+        pos (int): The offset of the first line to scan.
+
+    Returns:
+        Iterator[tuple[int, tuple]]: Pairs of line offset and event.
+    """
+    for match in EVENT_PATTERN.finditer(buffer, pos):
+        yield match.start(), _to_event(match)
+
+
+def event_at(buffer, offset: int) -> tuple | None:
+    """
+    Return the typed event for the line starting at `offset`, or None if that line is not an event of interest.
+
+    Parameters:
+        buffer: A bytes-like object or mmap holding MIDICSV text.
+        offset (int): The offset of the start of a line.
+
+    Returns:
+        tuple | None: The event.
+    """
+    match = EVENT_PATTERN.match(buffer, offset)
+    return _to_event(match) if match else None
+
+
+def open_buffer(filename: str) -> mmap.mmap | bytes:
+    """
+    Memory-map a file for reading.
+    Empty files cannot be mapped, so an empty bytes object is returned for them instead.
+
+    Parameters:
+        filename (str): Path to the file.
+
+    Returns:
+        mmap.mmap | bytes: A read-only view of the file.
+    """
+    with open(filename, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return b''
+
+
+def close_buffer(buffer: mmap.mmap | bytes):
+    """
+    Release a buffer returned by `open_buffer`.
+
+    Parameters:
+        buffer (mmap.mmap | bytes): The buffer to release.
+
+    Returns:
+        None
+    """
+    if isinstance(buffer, mmap.mmap):
+        buffer.close()
+
+
+def tokenize(filename: str) -> Iterator[tuple]:
+    """
+    Yield the typed events of a MIDICSV file, skipping every record type the parser does not use.
+
+    Parameters:
+        filename (str): Path to the MIDICSV file.
+
+    Returns:
+        Iterator[tuple]: The events, in file order.
+    """
+    # The map is released together with the iterator, once no match references it any more
+    for match in EVENT_PATTERN.finditer(open_buffer(filename)):
+        yield _to_event(match)
+
+
+class FileEvents:
+    """
+    FileEvents Class
+
+    The typed events of a MIDICSV file as a re-iterable: every iteration tokenizes the memory-mapped file again, so
+    several passes over the events never hold all of them in memory at once.
+
+    Attributes:
+        filename (str): Path to the MIDICSV file.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+    def __iter__(self) -> Iterator[tuple]:
+        return tokenize(self.filename)
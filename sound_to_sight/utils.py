@@ -1,20 +1,67 @@
+import hashlib
 import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from BPMtoFPS import ticks_to_seconds, beats_to_seconds
+from .frame_rate import FrameRateSolver, tempo_from_bpm
+
+
+TIMELINE_FILE = 'timeline.json'
+PATTERNS_FILE = 'patterns.json'
+PLAYERS_FILE = 'players.json'
+PROJECT_DETAIL_FILE = 'project_detail.json'
+PATTERN_CLUSTERS_FILE = 'pattern_clusters.json'
+KEYFRAMES_FILE = 'keyframes.json'
+MANIFEST_FILE = 'manifest.json'
+
+# mkstemp creates files readable by the owner only; new files get this mode instead, replaced ones keep their own
+DEFAULT_FILE_MODE = 0o644
+
+
+def write_atomic(filename, content):
+    # Write beside the target and rename over it, so readers never see a partially written file
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(filename) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            try:
+                shutil.copymode(filename, tmp_path)
+            except FileNotFoundError:
+                os.chmod(tmp_path, DEFAULT_FILE_MODE)
+            tmp_file.write(content)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, filename)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_json_atomic(filename, data, indent=None):
+    content = json.dumps(data, indent=indent).encode()
+    write_atomic(filename, content)
+    return hashlib.sha256(content).hexdigest()
+
+
+def build_project_details(pattern_fps, project_length, sections, pattern_length, fps, video_resolution):
+    return {'pattern_fps': pattern_fps,
+            'project_length': project_length,
+            'sections': sections,
+            'pattern_length': pattern_length,
+            'fps': fps,
+            'video_resolution': video_resolution}
 
 
 def export_project_details(pattern_fps, project_length, sections, pattern_length, fps, video_resolution, filename):
-    project_details = {'pattern_fps': pattern_fps,
-                       'project_length': project_length,
-                       'sections': sections,
-                       'pattern_length': pattern_length,
-                       'fps': fps,
-                       'video_resolution': video_resolution}
+    project_details = build_project_details(pattern_fps, project_length, sections, pattern_length, fps,
+                                            video_resolution)
 
-    with open(filename, 'w') as json_file:
-        json.dump(project_details, json_file, indent=4)
+    return write_json_atomic(filename, project_details, indent=4)
 
 
-def export_timeline(player_measures_dict, filename):
+def build_timeline(player_measures_dict):
     section_dict = {}
     for player in player_measures_dict.values():
         for player_measure in player:
@@ -28,13 +75,16 @@ def export_timeline(player_measures_dict, filename):
             meas_dict = sec_dict.setdefault(meas, {})
             meas_dict[player_num] = {pattern_hash: play_count}
 
-    section_dict = {key: dict(sorted(inner_dict.items())) for key, inner_dict in section_dict.items()}
+    return {key: dict(sorted(inner_dict.items())) for key, inner_dict in section_dict.items()}
+
 
-    with open(filename, 'w') as json_file:
-        json.dump(section_dict, json_file, indent=4)
+def export_timeline(player_measures_dict, filename):
+    section_dict = build_timeline(player_measures_dict)
 
+    return write_json_atomic(filename, section_dict, indent=4)
 
-def export_player_definitions(player_measures_dict, filename):
+
+def build_player_definitions(player_measures_dict):
     player_definitions = {}
     for player in player_measures_dict.values():
         player_number = player[0].player_number
@@ -44,11 +94,16 @@ def export_player_definitions(player_measures_dict, filename):
 
         player_definitions[player_number] = {'instrument': instrument, 'layout': layout, 'footage': footage}
 
-    with open(filename, 'w') as json_file:
-        json.dump(player_definitions, json_file, indent=4)
+    return player_definitions
 
 
-def export_pattern_definitions(player_measures_dict, filename):
+def export_player_definitions(player_measures_dict, filename):
+    player_definitions = build_player_definitions(player_measures_dict)
+
+    return write_json_atomic(filename, player_definitions, indent=4)
+
+
+def build_pattern_definitions(player_measures_dict):
     pattern_definitions = {}
     processed_hashes = set()  # Set to keep track of processed pattern hashes
 
@@ -77,26 +132,86 @@ def export_pattern_definitions(player_measures_dict, filename):
                 hash_dict.append([frame_start, note_value, velocity, frame_duration, [x, y]])
 
     # Sort the pattern definitions
-    pattern_definitions = {key: dict(sorted(inner_dict.items())) for key, inner_dict in pattern_definitions.items()}
-
-    with open(filename, 'w') as json_file:
-        json.dump(pattern_definitions, json_file)
-
+    return {key: dict(sorted(inner_dict.items())) for key, inner_dict in pattern_definitions.items()}
 
-def calculate_fps(bpm, beats_per_measure, fps_min=24, fps_max=60):
-    # Calculate the duration of one measure in seconds
-    duration_of_one_measure = (60 * beats_per_measure) / bpm
 
-    # Iterate through the FPS range to find integer values
-    for fps in range(fps_max, fps_min - 1, -1):
-        frames_per_measure = fps * duration_of_one_measure
-
-        # Check if the frames per measure is an integer
-        if frames_per_measure.is_integer():
-            print(f"Adjusting frame rate of patterns to {fps} frames per second.")
-            return fps
-
-    return None
+def export_pattern_definitions(player_measures_dict, filename):
+    pattern_definitions = build_pattern_definitions(player_measures_dict)
+
+    return write_json_atomic(filename, pattern_definitions)
+
+
+def _file_matches(path, content):
+    # Compare against what is actually on disk rather than a manifest, which may not describe the file any more
+    try:
+        if os.path.getsize(path) != len(content):
+            return False
+        with open(path, 'rb') as existing_file:
+            return existing_file.read() == content
+    except OSError:
+        return False
+
+
+def _export_document(path, build, args, indent):
+    # Serialize first, so an output whose file already holds the same content is left untouched (keeping its
+    # modification time)
+    content = json.dumps(build(*args), indent=indent).encode()
+    digest = hashlib.sha256(content).hexdigest()
+    if not _file_matches(path, content):
+        write_atomic(path, content)
+    return {'sha256': digest, 'size': len(content)}
+
+
+def export_all(player_measures_dict, pattern_fps, project_length, sections, pattern_length, fps, video_resolution,
+               output_dir='.', cluster_threshold=None, keyframes=False):
+    # Documents are built and written concurrently, each atomically. The manifest maps every file to its SHA-256 and
+    # size so downstream tools can skip reloading unchanged files; it is written last, once every file is in place.
+    os.makedirs(output_dir, exist_ok=True)
+    documents = {
+        TIMELINE_FILE: (build_timeline, (player_measures_dict,), 4),
+        PATTERNS_FILE: (build_pattern_definitions, (player_measures_dict,), None),
+        PLAYERS_FILE: (build_player_definitions, (player_measures_dict,), 4),
+        PROJECT_DETAIL_FILE: (build_project_details, (pattern_fps, project_length, sections, pattern_length, fps,
+                                                      video_resolution), 4),
+    }
+    if cluster_threshold is not None:
+        # Optional near-duplicate analysis, for renderers that reuse a base precomp and redraw only the diff
+        from .similarity import build_pattern_clusters
+        documents[PATTERN_CLUSTERS_FILE] = (build_pattern_clusters, (player_measures_dict, cluster_threshold), None)
+    if keyframes:
+        # Optional per-frame strike animation, so After Effects sets keyframes instead of computing them (needs NumPy)
+        from .keyframes import build_keyframes
+        documents[KEYFRAMES_FILE] = (build_keyframes, (player_measures_dict, pattern_fps, fps), None)
+
+    with ThreadPoolExecutor(max_workers=len(documents)) as executor:
+        futures = {name: executor.submit(_export_document, os.path.join(output_dir, name), build, args, indent)
+                   for name, (build, args, indent) in documents.items()}
+        files = {name: future.result() for name, future in futures.items()}
+
+    write_json_atomic(os.path.join(output_dir, MANIFEST_FILE), {'files': files}, indent=4)
+    return files
+
+
+def calculate_fps(bpm, beats_per_measure, fps_min=24, fps_max=60, tempos=None, solver=None, frame_rates=None,
+                  target=None):
+    # Exact frame rate search, over the range or an explicit set of frame rates and ranked by closeness to the target;
+    # pass a shared solver to reuse its results across the tracks of a batch
+    solver = solver or FrameRateSolver(fps_min, fps_max, frame_rates=frame_rates, target=target)
+    tempos = tempos or [tempo_from_bpm(bpm)]
+    fps = solver.best(tempos, beats_per_measure)
+
+    if fps is None:
+        if frame_rates is not None:
+            print(f"None of the frame rates {', '.join(map(str, frame_rates))} gives a whole number of frames per "
+                  f"measure.")
+        else:
+            print(f"No frame rate between {fps_min} and {fps_max} gives a whole number of frames per measure.")
+        return None
+
+    # Keep integer rates as ints so the exported JSON is unchanged for them
+    fps = int(fps) if fps.denominator == 1 else float(fps)
+    print(f"Adjusting frame rate of patterns to {fps} frames per second.")
+    return fps
 
 
 def music_to_video_length(length, bpm, division):
@@ -0,0 +1,45 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from sound_to_sight.cli import COLD_START_COMMAND, build_parser
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLD_START_RUNS = 5
+COLD_START_BUDGET_MS = 250  # Generous against the ~45 ms measured locally, so only a real regression trips it
+
+# Heavy dependencies that must only be imported by the subcommand that needs them
+DEFERRED_MODULES = ('mmh3', 'BPMtoFPS', 'numpy', 'sqlite3')
+
+
+def _run(command):
+    return subprocess.run(command, cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                          check=True)
+
+
+def test_cold_start_within_budget():
+    _run(COLD_START_COMMAND)  # Warm the file system cache and bytecode
+    timings = []
+    for _ in range(COLD_START_RUNS):
+        start = time.perf_counter()
+        _run(COLD_START_COMMAND)
+        timings.append((time.perf_counter() - start) * 1000)
+    assert statistics.median(timings) < COLD_START_BUDGET_MS, timings
+
+
+def test_cli_import_defers_heavy_dependencies():
+    # A fresh interpreter, since other tests may already have imported these modules into this one
+    code = f"import sys, sound_to_sight.cli; print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    loaded = _run([sys.executable, '-c', code]).stdout.strip()
+    assert loaded == '', f"Imported at start-up: {loaded}"
+
+
+def test_options_before_files():
+    for command in ('parse', 'export'):
+        args = build_parser().parse_args([command, '-c', '0.7', '-s', '329,676', 't1.csv', '-f', '60'])
+        assert args.clusters == 0.7
+        assert args.sections == [329, 676]
+        assert args.input_files == ['t1.csv']
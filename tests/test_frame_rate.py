@@ -0,0 +1,55 @@
+from fractions import Fraction
+
+import pytest
+
+from sound_to_sight.frame_rate import NTSC_FRAME_RATES, FrameRateSolver, to_frame_rate
+from sound_to_sight.utils import calculate_fps
+
+
+NTSC_23_976, NTSC_29_97, NTSC_59_94 = NTSC_FRAME_RATES
+NTSC_TEMPO = 250250  # A 4/4 measure lasts exactly 1.001 seconds
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('23.976', NTSC_23_976), ('23.98', NTSC_23_976), ('29.97', NTSC_29_97), ('29.970', NTSC_29_97),
+    ('59.94', NTSC_59_94), ('30000/1001', NTSC_29_97), (30, Fraction(30)), ('24', Fraction(24)),
+    (Fraction(25), Fraction(25)),
+])
+def test_to_frame_rate_aliases(value, expected):
+    assert to_frame_rate(value) == expected
+
+
+@pytest.mark.parametrize('value', ['0', '-30'])
+def test_to_frame_rate_rejects_non_positive(value):
+    with pytest.raises(ValueError):
+        to_frame_rate(value)
+
+
+def test_ntsc_rates_accepted_exactly_in_default_range():
+    # Only the NTSC rates give whole frames per measure; none of the integer rates do
+    assert FrameRateSolver(24, 60).solve([NTSC_TEMPO], 4) == [NTSC_59_94, NTSC_29_97, NTSC_23_976]
+
+
+def test_ntsc_rates_filtered_by_nominal_rate():
+    assert NTSC_23_976 not in FrameRateSolver(25, 60).solve([NTSC_TEMPO], 4)
+    assert FrameRateSolver(24, 24).solve([NTSC_TEMPO], 4) == [NTSC_23_976]
+    assert FrameRateSolver(24, 60, include_ntsc=False).solve([NTSC_TEMPO], 4) == []
+
+
+def test_tempo_map_rejects_rates():
+    solver = FrameRateSolver(24, 60)
+    assert Fraction(60) in solver.solve([500000], 4)
+    # A second tempo must also span whole frames, which no candidate does for both
+    assert solver.solve([500000, NTSC_TEMPO], 4) == []
+    assert solver.best([500000, NTSC_TEMPO], 4) is None
+
+
+def test_ranking_prefers_target_then_higher_rate():
+    solver = FrameRateSolver(frame_rates=[29, 31, 24, 60], target=30)
+    assert solver.solve([500000], 4) == [Fraction(31), Fraction(29), Fraction(24), Fraction(60)]
+
+
+def test_calculate_fps_passes_frame_rates_and_target():
+    assert calculate_fps(240, 4, tempos=[500000], frame_rates=['24', '29.97', '30'], target=24) == 24
+    assert calculate_fps(240, 4, tempos=[NTSC_TEMPO], frame_rates=['29.97', '30']) == float(NTSC_29_97)
+    assert calculate_fps(240, 4, tempos=[NTSC_TEMPO], frame_rates=['30']) is None
@@ -0,0 +1,27 @@
+import math
+import os
+
+from sound_to_sight.csv_reader import MidiCsvParser, Resources
+from sound_to_sight.keyframes import KEYFRAME_OFFSETS, MATTE_PEAK, build_keyframes
+from sound_to_sight.utils import build_pattern_definitions
+
+
+CSV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CSVs', 'Six Marimbas Track 2.csv')
+
+
+def test_keyframes_use_pattern_frames_like_test_jsx():
+    player_measures = MidiCsvParser(CSV_FILE, 60, [329], Resources()).parse()[0]
+    patterns = build_pattern_definitions(player_measures)
+
+    # A pattern frame rate different from fps must not move the keyframes: test.jsx places each note at
+    # note[0] / patternFPS, where note[0] is the start frame in patterns.json
+    document = build_keyframes(player_measures, 30, 60)
+    assert document['pattern_fps'] == 30
+    for layout, layout_patterns in patterns.items():
+        for pattern_hash, notes in layout_patterns.items():
+            keyframes = document['patterns'][layout][pattern_hash]
+            assert keyframes['frame'] == [math.floor(note[0]) + KEYFRAME_OFFSETS[0] for note in notes]
+            for note, matte in zip(notes, keyframes['matte']):
+                if note[0] == int(note[0]):
+                    # The matte peaks on the note's own start frame
+                    assert matte[-KEYFRAME_OFFSETS[0]] == MATTE_PEAK
@@ -0,0 +1,88 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from sound_to_sight.csv_reader import MidiCsvParser, Resources
+from sound_to_sight.measure_index import MeasureIndex
+
+
+CSV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CSVs', 'Six Marimbas Track 3.csv')
+SECTIONS = [329, 676]
+
+
+def _summary(player_measures):
+    return [(pm.player_number, pm.measure_number, pm.section_number, pm.pattern.hash, pm.play_count)
+            for player in player_measures.values() for pm in player]
+
+
+@pytest.fixture(scope='module')
+def csv_copy(tmp_path_factory):
+    # The index is written beside the file, so work on a copy
+    path = tmp_path_factory.mktemp('csv') / 'track.csv'
+    shutil.copyfile(CSV_FILE, path)
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def resources():
+    return Resources()
+
+
+def test_range_parse_matches_full_parse(csv_copy, resources):
+    full = _summary(MidiCsvParser(csv_copy, 60, list(SECTIONS), resources).parse()[0])
+    starts = [measure for _, measure, *_ in full]
+    index = MeasureIndex.load_or_build(csv_copy)
+
+    # A range running from the start of one player measure to just before another holds exactly the player measures
+    # in between, with the same play counts
+    for first in range(len(full)):
+        for last in sorted({first + 1, first + 3, len(full)}):
+            if last > len(full):
+                continue
+            last_measure = starts[last] - 1 if last < len(full) else starts[-1] + 1000
+            part = MidiCsvParser(csv_copy, 60, list(SECTIONS), resources).parse_range(starts[first], last_measure,
+                                                                                        index)
+            assert _summary(part[0]) == full[first:last], (starts[first], last_measure)
+
+
+def test_range_parse_pairs_note_offs_like_full_parse(tmp_path, resources):
+    # Note 65 rings from measure 1 into measure 2, where it is struck again; a range starting at measure 2 must pair
+    # the note-offs exactly as the full parse does
+    path = tmp_path / 'carried.csv'
+    path.write_text('\n'.join([
+        '0, 0, Header, 0, 1, 480',
+        '1, 0, Start_track',
+        '1, 0, Title_t, "Marimba"',
+        '1, 0, Time_signature, 4, 2, 24, 8',
+        '1, 0, Tempo, 312500',
+        '1, 0, Note_on_c, 0, 65, 74',
+        '1, 2400, Note_on_c, 0, 65, 80',
+        '1, 2880, Note_off_c, 0, 65, 64',
+        '1, 3120, Note_off_c, 0, 65, 64',
+        '1, 3840, Note_on_c, 0, 70, 74',
+        '1, 4080, Note_off_c, 0, 70, 64',
+        '1, 4320, End_track',
+    ]) + '\n')
+
+    full = _summary(MidiCsvParser(str(path), 60, [], resources).parse()[0])
+    part = _summary(MidiCsvParser(str(path), 60, [], resources).parse_range(2, 2)[0])
+    assert part == [pm for pm in full if pm[1] == 2]
+
+
+def test_index_is_rebuilt_when_file_changes(csv_copy):
+    index = MeasureIndex.load_or_build(csv_copy)
+    expected_length = index.total_length
+
+    # Tamper with the saved index: it is used as long as the file is unchanged
+    with open(index.index_path) as json_file:
+        data = json.load(json_file)
+    data['total_length'] = -1
+    with open(index.index_path, 'w') as json_file:
+        json.dump(data, json_file)
+    assert MeasureIndex.load_or_build(csv_copy).total_length == -1
+
+    stat = os.stat(csv_copy)
+    os.utime(csv_copy, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert MeasureIndex.load_or_build(csv_copy).total_length == expected_length
@@ -0,0 +1,49 @@
+import asyncio
+import json
+import os
+
+from sound_to_sight.service import ParseService
+
+
+CSV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CSVs')
+
+
+async def _post(socket_path, data, query='fps=60&sections=329,676'):
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    writer.write(f"POST /parse?{query} HTTP/1.1\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+async def _post_files(socket_path, names):
+    service = ParseService(workers=1)
+    server_task = asyncio.create_task(service.serve(unix_path=socket_path))
+    try:
+        while not os.path.exists(socket_path):
+            await asyncio.sleep(0.01)
+        results = []
+        for name in names:
+            with open(os.path.join(CSV_DIR, name), 'rb') as f:
+                results.append(await _post(socket_path, f.read()))
+        return results
+    finally:
+        server_task.cancel()
+        try:
+            await server_task
+        except asyncio.CancelledError:
+            pass
+
+
+def test_parse_upload_without_layout_is_unprocessable(tmp_path):
+    (status, body), (ok_status, ok_body) = asyncio.run(_post_files(
+        str(tmp_path / 'service.sock'), ['Six Marimbas Track 5.csv', 'Six Marimbas Track 1.csv']))
+
+    # The worker cannot prompt for an instrument, so the upload is rejected instead of failing on stdin
+    assert status == 422
+    assert 'marimba 5-1' in body['error']
+
+    assert ok_status == 200
+    assert set(ok_body) == {'timeline', 'patterns', 'players', 'project_detail'}
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from sound_to_sight.cli import build_parser
+from sound_to_sight.csv_reader import MidiCsvParser, Resources
+from sound_to_sight.spill_store import MeasureStore
+from sound_to_sight.utils import build_pattern_definitions, build_player_definitions, build_timeline
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_FILE = os.path.join(REPO_ROOT, 'tests', 'CSVs', 'Six Marimbas Track 3.csv')
+
+
+def test_spilled_parse_matches_in_memory_parse():
+    resources = Resources()
+    in_memory = MidiCsvParser(CSV_FILE, 60, [329, 676], resources).parse()[0]
+    with MeasureStore() as store:
+        spilled = MidiCsvParser(CSV_FILE, 60, [329, 676], resources).parse(store)[0]
+        for build in (build_timeline, build_pattern_definitions, build_player_definitions):
+            assert build(spilled) == build(in_memory)
+        path = store.path
+    assert not os.path.exists(path)
+
+
+def test_store_refuses_existing_file(tmp_path):
+    existing = tmp_path / 'measures.sqlite'
+    existing.write_bytes(b'keep me')
+    with pytest.raises(FileExistsError):
+        MeasureStore(str(existing))
+    assert existing.read_bytes() == b'keep me'
+
+
+def test_out_of_core_rejects_measure_range():
+    with pytest.raises(SystemExit):
+        build_parser().parse_args(['parse', 't1.csv', '--out_of_core', '-m', '1', '4'])
+
+
+def test_parse_without_out_of_core_does_not_load_sqlite():
+    code = ("import sys; from sound_to_sight.cli import main; main(['parse', sys.argv[1]]); "
+            "print('sqlite3' in sys.modules)")
+    result = subprocess.run([sys.executable, '-c', code, CSV_FILE], cwd=REPO_ROOT, stdout=subprocess.PIPE, text=True,
+                            check=True)
+    assert result.stdout.splitlines()[-1] == 'False'
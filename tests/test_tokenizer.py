@@ -0,0 +1,28 @@
+import os
+import pickle
+
+from sound_to_sight.csv_reader import MidiCsvParser, Resources
+from sound_to_sight.tokenizer import tokenize
+from sound_to_sight.utils import build_pattern_definitions, build_timeline
+
+
+CSV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CSVs', 'Six Marimbas Track 2.csv')
+
+
+def test_pickled_events_parse_like_tokenized_events():
+    resources = Resources()
+    expected = MidiCsvParser(CSV_FILE, 60, [329], resources).parse()[0]
+
+    # As received by a worker process; the event types are equal to the constants but no longer identical
+    events = pickle.loads(pickle.dumps(list(tokenize(CSV_FILE))))
+    result = MidiCsvParser(CSV_FILE, 60, [329], resources).parse_events(events)[0]
+
+    assert build_timeline(result) == build_timeline(expected)
+    assert build_pattern_definitions(result) == build_pattern_definitions(expected)
+
+
+def test_parse_events_accepts_one_shot_iterator():
+    resources = Resources()
+    expected = MidiCsvParser(CSV_FILE, 60, [329], resources).parse()[0]
+    result = MidiCsvParser(CSV_FILE, 60, [329], resources).parse_events(iter(tokenize(CSV_FILE)))[0]
+    assert build_timeline(result) == build_timeline(expected)
@@ -0,0 +1,44 @@
+import json
+import os
+import stat
+
+from sound_to_sight.utils import MANIFEST_FILE, PATTERNS_FILE, TIMELINE_FILE, export_all
+
+
+def _export(output_dir):
+    return export_all({}, 60, 10.0, [0.0], 1.25, 60, (3840, 2160), str(output_dir))
+
+
+def test_export_replaces_stale_output(tmp_path):
+    expected = _export(tmp_path)
+    patterns_path = tmp_path / PATTERNS_FILE
+    original = patterns_path.read_bytes()
+
+    # As left by another export that failed before writing its manifest
+    patterns_path.write_text(json.dumps({'marimba': {'1': []}}))
+    _export(tmp_path)
+
+    assert patterns_path.read_bytes() == original
+    assert json.loads((tmp_path / MANIFEST_FILE).read_text())['files'] == expected
+
+
+def test_export_leaves_matching_output_untouched(tmp_path):
+    _export(tmp_path)
+    timeline_path = tmp_path / TIMELINE_FILE
+    os.utime(timeline_path, ns=(0, 0))
+
+    _export(tmp_path)
+
+    assert timeline_path.stat().st_mtime_ns == 0
+
+
+def test_export_file_modes(tmp_path):
+    _export(tmp_path)
+    assert stat.S_IMODE((tmp_path / TIMELINE_FILE).stat().st_mode) == 0o644
+
+    # A replaced file keeps the mode it had
+    patterns_path = tmp_path / PATTERNS_FILE
+    patterns_path.write_text('{}')
+    patterns_path.chmod(0o600)
+    _export(tmp_path)
+    assert stat.S_IMODE(patterns_path.stat().st_mode) == 0o600